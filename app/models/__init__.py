@@ -1,3 +1,7 @@
 from .schemas import TextRequest, TranscriptionResponse, UploadResponse, AudioResponse
+from .records import Message, StreamingSession, intern_role
 
-__all__ = ['TextRequest', 'TranscriptionResponse', 'UploadResponse', 'AudioResponse']
+__all__ = [
+    'TextRequest', 'TranscriptionResponse', 'UploadResponse', 'AudioResponse',
+    'Message', 'StreamingSession', 'intern_role',
+]
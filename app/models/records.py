@@ -0,0 +1,117 @@
+"""
+Compact in-memory records for chat history and streaming sessions
+
+History can hold millions of messages and the /ws registry thousands of
+sessions, so both use ``__slots__`` classes instead of dicts: no per-object
+``__dict__``, role strings shared through interning and timestamps stored as
+a single float. Messages still read like the ``{"role", "content"}`` dicts
+they replace (``message["role"]``, ``message.get(...)``, ``dict(message)``),
+and serialize to exactly that shape.
+"""
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional
+
+# Roles seen in history; anything else is interned on first use
+ROLES = {role: sys.intern(role) for role in ("user", "assistant", "system")}
+
+
+def intern_role(role: str) -> str:
+    """Shared string object for a role"""
+    shared = ROLES.get(role)
+    if shared is None:
+        shared = ROLES.setdefault(role, sys.intern(role))
+    return shared
+
+
+class Message:
+    """
+    One chat message
+
+    Args:
+        role: ``user``, ``assistant`` or ``system``
+        content: Message text
+        ts: Creation time (epoch seconds), None for messages from before
+            timestamps were recorded
+    """
+
+    __slots__ = ("role", "content", "ts")
+
+    def __init__(self, role: str, content: str, ts: Optional[float] = None):
+        self.role = intern_role(role)
+        self.content = content
+        self.ts = ts
+
+    @classmethod
+    def new(cls, role: str, content: str) -> "Message":
+        """A message created now"""
+        return cls(role, content, round(time.time(), 3))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        return cls(data.get("role", "user"), data.get("content", ""), data.get("ts"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"role": self.role, "content": self.content}
+        if self.ts is not None:
+            data["ts"] = self.ts
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    # Read-only mapping interface, so code written for message dicts keeps working
+
+    def keys(self):
+        return ("role", "content", "ts") if self.ts is not None else ("role", "content")
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Message):
+            return (self.role, self.content, self.ts) == (other.role, other.content, other.ts)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content[:40]!r})"
+
+
+class StreamingSession:
+    """Live state of one /ws connection, owned by the worker that accepted it"""
+
+    __slots__ = (
+        "session_id", "recorder", "start_time", "chunk_count", "ack_bytes",
+        "assemblyai_streamer", "murf_service", "outbound", "instrumentation",
+    )
+
+    def __init__(self, session_id: str, recorder, assemblyai_streamer=None, murf_service=None,
+                 outbound=None, instrumentation=None):
+        self.session_id = session_id
+        self.recorder = recorder
+        self.start_time = time.time()
+        self.chunk_count = 0
+        self.ack_bytes = 0
+        self.assemblyai_streamer = assemblyai_streamer
+        self.murf_service = murf_service
+        self.outbound = outbound
+        self.instrumentation = instrumentation
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable summary (live objects are left out)"""
+        return {
+            "session_id": self.session_id,
+            "start_time": self.start_time,
+            "chunk_count": self.chunk_count,
+        }
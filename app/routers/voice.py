@@ -9,6 +9,7 @@ from io import BytesIO
 
 from ..models.schemas import TextRequest, TranscriptionResponse, UploadResponse
 from ..services.tts import generate_speech
+from ..services.tts_cache import get_tts_cache
 from ..services.stt import transcribe_audio_file
 from ..utils.fallback import get_fallback_audio_bytes
 
@@ -36,6 +37,11 @@ async def generate_voice(data: TextRequest):
     """Generate voice from text"""
     return await generate_speech(data.text, data.voice)
 
+@router.get("/tts/cache/stats")
+async def tts_cache_stats():
+    """TTS cache hit/miss and size metrics"""
+    return get_tts_cache().stats()
+
 @router.post("/upload")
 async def upload_audio(file: UploadFile = File(...)) -> UploadResponse:
     """Upload audio file"""
@@ -2,5 +2,6 @@ from .tts import generate_speech
 from .stt import transcribe_audio_file
 from .llm import GeminiService
 from .chat_manager import ChatManager
+from .history_store import HistoryStore, create_history_store
 
-__all__ = ['generate_speech', 'transcribe_audio_file', 'GeminiService', 'ChatManager']
+__all__ = ['generate_speech', 'transcribe_audio_file', 'GeminiService', 'ChatManager', 'HistoryStore', 'create_history_store']
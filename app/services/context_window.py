@@ -0,0 +1,227 @@
+"""
+Token-budgeted conversation context for LLM requests
+
+Sending the whole history on every turn makes request size, latency and cost
+grow with the length of the conversation. The context window keeps the most
+recent turns verbatim within a token budget and folds everything older into
+a rolling summary that is sent as a system message.
+
+The summary is updated incrementally and cached per session: each message is
+folded once, when it leaves the verbatim window. Folding is extractive (the
+first sentence of each message) so building a request never waits on the
+network; if an LLM summarizer is configured it rewrites the summary in the
+background and its result replaces the extractive part once ready.
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# (previous summary, newly folded messages) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    # Role and framing overhead per message
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def summary_line(message: Dict[str, str], max_chars: int = 160) -> str:
+    """One extractive summary line: the first sentence of a message"""
+    content = " ".join(message.get("content", "").split())
+    first = _SENTENCE_END.split(content, 1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rstrip() + "…"
+    role = "User" if message.get("role") == "user" else "Assistant"
+    return f"{role}: {first}"
+
+
+class _SessionContext:
+    """Rolling summary of one session's folded messages"""
+
+    __slots__ = ("covered", "base", "base_covered", "tail", "tail_tokens", "task")
+
+    def __init__(self):
+        # Messages [0:covered] are folded into the summary
+        self.covered = 0
+        # LLM-written summary of messages [0:base_covered]
+        self.base = ""
+        self.base_covered = 0
+        # Extractive lines (index, line) for messages [base_covered:covered]
+        self.tail: deque = deque()
+        self.tail_tokens = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class ContextWindow:
+    """
+    Args:
+        max_tokens: Budget for the whole request context (summary + turns)
+        keep_turns: Most recent user/assistant turns kept verbatim
+        summary_tokens: Budget for the rolling summary
+        summarizer: Optional async LLM summarizer run in the background
+        max_sessions: Sessions whose summary state is cached
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        keep_turns: int = 8,
+        summary_tokens: int = 400,
+        summarizer: Optional[Summarizer] = None,
+        max_sessions: int = 1000
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _SessionContext]" = OrderedDict()
+        self.builds = 0
+        self.folded = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def build(self, session_id: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Messages to send for ``history`` (ending with the new user message)
+
+        Returns the recent turns verbatim, preceded by a ``system`` summary
+        message when older turns have been folded.
+        """
+        self.builds += 1
+        state = self._state(session_id)
+        if len(history) < state.covered:
+            # History was deleted or replaced: start over
+            state = self._reset(session_id)
+
+        start = self._window_start(history)
+        if start > state.covered:
+            for index in range(state.covered, start):
+                line = summary_line(history[index])
+                state.tail.append((index, line))
+                state.tail_tokens += estimate_tokens(line)
+            # Lines that can no longer fit the summary are dropped for good
+            while state.tail_tokens > self.summary_tokens and len(state.tail) > 1:
+                state.tail_tokens -= estimate_tokens(state.tail.popleft()[1])
+            self.folded += start - state.covered
+            state.covered = start
+            self._schedule_summary(state, history[:start])
+
+        messages = [{"role": m["role"], "content": m["content"]} for m in history[start:]]
+        summary = self._summary_text(state)
+        if summary:
+            messages.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary})
+        return messages
+
+    def _window_start(self, history: List[Dict[str, str]]) -> int:
+        """Index of the first message kept verbatim"""
+        budget = self.max_tokens - self.summary_tokens
+        max_messages = self.keep_turns * 2
+        start = len(history)
+        used = 0
+        while start > 0:
+            cost = message_tokens(history[start - 1])
+            kept = len(history) - start
+            # The newest message is always sent, whatever its size
+            if kept and (kept >= max_messages or used + cost > budget):
+                break
+            used += cost
+            start -= 1
+        # Start the window on a user message so turns stay whole
+        while start < len(history) - 1 and history[start].get("role") != "user":
+            start += 1
+        return start
+
+    def _summary_text(self, state: _SessionContext) -> str:
+        parts = [state.base] if state.base else []
+        budget = self.summary_tokens - (estimate_tokens(state.base) if state.base else 0)
+        lines: List[str] = []
+        # Newest folded lines win when the summary is over budget
+        for _, line in reversed(state.tail):
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            budget -= cost
+            lines.append(line)
+        parts.extend(reversed(lines))
+        return "\n".join(parts)
+
+    def _schedule_summary(self, state: _SessionContext, folded: List[Dict[str, str]]) -> None:
+        if self.summarizer is None or (state.task and not state.task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        state.task = loop.create_task(self._summarize(state, folded))
+
+    async def _summarize(self, state: _SessionContext, folded: List[Dict[str, str]]) -> None:
+        covered = len(folded)
+        try:
+            text = await self.summarizer(state.base, folded[state.base_covered:covered])
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"⚠️ Summarizing conversation failed, keeping extractive summary: {e}")
+            return
+        text = text.strip()
+        if not text:
+            return
+        # Trim to budget so the LLM summary cannot crowd out the turns
+        max_chars = self.summary_tokens * 4
+        state.base = text[:max_chars]
+        state.base_covered = covered
+        while state.tail and state.tail[0][0] < covered:
+            state.tail_tokens -= estimate_tokens(state.tail.popleft()[1])
+        self.summaries += 1
+
+    def _state(self, session_id: str) -> _SessionContext:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = _SessionContext()
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                if evicted.task:
+                    evicted.task.cancel()
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def _reset(self, session_id: str) -> _SessionContext:
+        self.forget(session_id)
+        return self._state(session_id)
+
+    def forget(self, session_id: str) -> None:
+        """Drop the cached summary of a session"""
+        state = self._sessions.pop(session_id, None)
+        if state and state.task:
+            state.task.cancel()
+
+    def clear(self) -> None:
+        """Drop every cached summary"""
+        for session_id in list(self._sessions):
+            self.forget(session_id)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sessions": len(self._sessions),
+            "builds": self.builds,
+            "folded_messages": self.folded,
+            "llm_summaries": self.summaries,
+            "llm_summary_failures": self.summary_failures,
+            "max_tokens": self.max_tokens,
+            "keep_turns": self.keep_turns,
+        }
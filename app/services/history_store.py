@@ -0,0 +1,1055 @@
+"""
+Chat history storage backends
+
+The in-memory view is always a ``{session_id: [Message, ...]}`` mapping; the
+backends only differ in how mutations are persisted:
+
+- ``JsonHistoryStore`` rewrites the whole JSON file on every change (legacy).
+- ``AppendLogHistoryStore`` appends one JSON line per mutation to a
+  write-ahead log and periodically compacts it into the JSON snapshot.
+
+Both keep their state in the process that owns them and read the whole
+history at startup. ``ShardedHistoryStore`` (the default) keeps one file per
+session and only loads a session when it is first used, into a cache bounded
+in bytes. ``SQLiteHistoryStore`` keeps no in-memory copy at all: every read
+and write goes to a shared SQLite database in WAL mode, so any number of
+worker processes can serve the same sessions.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.records import Message
+from app.utils.sqlite_db import connect, write_transaction
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # No advisory file locks (Windows): the single-process check of the sharded backend is skipped
+    FCNTL_AVAILABLE = False
+
+DEFAULT_COMPACT_EVERY = 500
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_IDLE_SECONDS = 1800.0
+# Characters of the last message shown in session listings
+PREVIEW_CHARS = 100
+
+
+def encode_cursor(*values) -> str:
+    """Opaque pagination cursor for a position in a listing"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of ``encode_cursor``; raises ValueError for a malformed cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+class HistoryStore:
+    """Base chat history store keeping every session in memory"""
+
+    backend_name = "memory"
+
+    def __init__(self):
+        self.sessions: Dict[str, List[Message]] = {}
+        self._lock = threading.RLock()
+
+    def load(self) -> None:
+        """Load persisted history into memory"""
+
+    def flush(self) -> None:
+        """Persist any buffered state"""
+
+    def close(self) -> None:
+        """Flush and release any open resources"""
+        self.flush()
+
+    def get_messages(self, session_id: str) -> List[Message]:
+        """Get the message list for a session"""
+        return self.sessions.get(session_id, [])
+
+    def has_session(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def session_count(self) -> int:
+        return len(self.sessions)
+
+    def append_message(self, session_id: str, role: str, content: str) -> Message:
+        """Append a message to a session, creating the session if needed"""
+        message = Message.new(role, content)
+        with self._lock:
+            messages = self.sessions.setdefault(session_id, [])
+            index = len(messages)
+            messages.append(message)
+            self._persist_append(session_id, index, message)
+        return message
+
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session, returning False if it did not exist"""
+        with self._lock:
+            if session_id not in self.sessions:
+                return False
+            del self.sessions[session_id]
+            self._persist_delete(session_id)
+        return True
+
+    def clear(self) -> int:
+        """Delete all sessions and return how many were removed"""
+        with self._lock:
+            session_count = len(self.sessions)
+            self.sessions.clear()
+            self._persist_clear()
+        return session_count
+
+    def get_messages_page(
+        self, session_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a session's messages, oldest first, each with its ``seq``
+
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        start = decode_cursor(cursor)[0] + 1 if cursor else 0
+        messages = self.get_messages(session_id)
+        page = [dict(message, seq=seq) for seq, message in enumerate(messages[start:start + limit], start)]
+        next_cursor = encode_cursor(page[-1]["seq"]) if start + limit < len(messages) else None
+        return page, next_cursor
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Summarize every session"""
+        sessions = []
+        for session_id, messages in list(self.sessions.items()):
+            sessions.append(self._session_summary(session_id, messages))
+        return sessions
+
+    def list_sessions_page(
+        self, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of session summaries and the cursor for the next one"""
+        start = decode_cursor(cursor)[0] if cursor else 0
+        with self._lock:
+            items = list(islice(self.sessions.items(), start, start + limit + 1))
+        page = [self._session_summary(session_id, messages) for session_id, messages in items[:limit]]
+        next_cursor = encode_cursor(start + limit) if len(items) > limit else None
+        return page, next_cursor
+
+    @staticmethod
+    def _session_summary(session_id: str, messages: List[Message]) -> dict:
+        return {
+            "session_id": session_id,
+            "message_count": len(messages),
+            "last_message": messages[-1]["content"][:PREVIEW_CHARS] + "..." if messages else "No messages"
+        }
+
+    def _persist_append(self, session_id: str, index: int, message: Message) -> None:
+        pass
+
+    def _persist_delete(self, session_id: str) -> None:
+        pass
+
+    def _persist_clear(self) -> None:
+        pass
+
+
+class JsonHistoryStore(HistoryStore):
+    """Rewrites the full JSON file after every mutation"""
+
+    backend_name = "json"
+
+    def __init__(self, path: str = "chat_history.json"):
+        super().__init__()
+        self.path = path
+
+    def load(self) -> None:
+        self.sessions = _read_snapshot(self.path)
+        logger.info("✅ Loaded chat history: %d sessions", len(self.sessions))
+
+    def flush(self) -> None:
+        with self._lock:
+            try:
+                _write_snapshot(self.path, self.sessions)
+                logger.info("💾 Saved chat history: %d sessions", len(self.sessions))
+            except Exception as e:
+                logger.error("❌ Error saving chat history: %s", e)
+
+    def _persist_append(self, session_id: str, index: int, message: Message) -> None:
+        self.flush()
+
+    def _persist_delete(self, session_id: str) -> None:
+        self.flush()
+
+    def _persist_clear(self) -> None:
+        self.flush()
+
+
+class AppendLogHistoryStore(HistoryStore):
+    """
+    Write-ahead log backend
+
+    Each mutation is written as a single JSON line to ``log_path``, so the
+    cost of an append is proportional to the message, not the whole store.
+    Every ``compact_every`` records the in-memory state is written to the
+    snapshot at ``path`` (atomically, via a temp file) and the log is
+    truncated.
+
+    Append records carry the message's position in its session, which makes
+    replay idempotent: if the process dies after the snapshot was replaced
+    but before the log was truncated, records already contained in the
+    snapshot are skipped instead of duplicated. A torn final line left by a
+    crash mid-write is discarded on load.
+    """
+
+    backend_name = "log"
+
+    def __init__(
+        self,
+        path: str = "chat_history.json",
+        log_path: Optional[str] = None,
+        compact_every: int = DEFAULT_COMPACT_EVERY,
+        fsync: bool = False
+    ):
+        super().__init__()
+        self.path = path
+        self.log_path = log_path or os.path.splitext(path)[0] + ".log"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._log = None
+        self._pending_records = 0
+
+    def load(self) -> None:
+        with self._lock:
+            self.sessions = _read_snapshot(self.path)
+            replayed = self._replay_log()
+            self._pending_records = replayed
+            self._log = open(self.log_path, "ab")
+        logger.info(
+            "✅ Loaded chat history: %d sessions (%d log records replayed)",
+            len(self.sessions), replayed
+        )
+
+    def _replay_log(self) -> int:
+        if not os.path.exists(self.log_path):
+            return 0
+
+        replayed = 0
+        good_offset = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                self._apply(record)
+                replayed += 1
+                good_offset += len(line)
+            size = f.seek(0, os.SEEK_END)
+
+        if good_offset < size:
+            logger.warning(
+                "⚠️ Discarding %d bytes of incomplete chat history log", size - good_offset
+            )
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_offset)
+        return replayed
+
+    def _apply(self, record: dict) -> None:
+        op = record.get("op")
+        if op == "append":
+            messages = self.sessions.setdefault(record["session_id"], [])
+            # Records at an index the snapshot already covers were compacted
+            if record["index"] == len(messages):
+                messages.append(Message.from_dict(record["message"]))
+        elif op == "delete":
+            self.sessions.pop(record["session_id"], None)
+        elif op == "clear":
+            self.sessions.clear()
+
+    def _write_record(self, record: dict) -> None:
+        if self._log is None:
+            self._log = open(self.log_path, "ab")
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        try:
+            self._log.write(line.encode("utf-8"))
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+        except Exception as e:
+            logger.error("❌ Error writing chat history log: %s", e)
+            return
+
+        self._pending_records += 1
+        if self._pending_records >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the log into the snapshot and truncate it"""
+        with self._lock:
+            try:
+                _write_snapshot(self.path, self.sessions)
+                if self._log is not None:
+                    self._log.seek(0)
+                    self._log.truncate()
+                    self._log.flush()
+                self._pending_records = 0
+                logger.info("💾 Compacted chat history: %d sessions", len(self.sessions))
+            except Exception as e:
+                logger.error("❌ Error compacting chat history: %s", e)
+
+    def flush(self) -> None:
+        if self._pending_records:
+            self.compact()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _persist_append(self, session_id: str, index: int, message: Message) -> None:
+        self._write_record({"op": "append", "session_id": session_id, "index": index, "message": message.to_dict()})
+
+    def _persist_delete(self, session_id: str) -> None:
+        self._write_record({"op": "delete", "session_id": session_id})
+
+    def _persist_clear(self) -> None:
+        self._write_record({"op": "clear"})
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Shared SQLite backend for multi-worker deployments
+
+    Messages are keyed by ``(session_id, seq)``. A ``sessions`` table keeps
+    each session's message count, last-message preview and created/updated
+    times, maintained on every append, so listing sessions never touches the
+    messages table and its cost does not grow with message volume. An
+    append reads the next sequence number and writes both tables inside one
+    ``BEGIN IMMEDIATE`` transaction, so concurrent appends from different
+    processes are serialized and none are lost or reordered. Every commit is
+    durable once it returns, so ``flush`` has nothing to do.
+
+    If ``import_path`` points at a JSON snapshot from the single-process
+    backends, that history is imported into a new (empty) database once.
+    """
+
+    backend_name = "sqlite"
+    schema_version = 3
+
+    def __init__(self, path: str = "chat_history.db", import_path: Optional[str] = None):
+        # No in-memory copy: ``sessions`` is read from the database on demand
+        self._lock = threading.RLock()
+        self.path = path
+        self.import_path = import_path
+        self._conn = None
+
+    @property
+    def sessions(self) -> Dict[str, List[Message]]:
+        """Full ``{session_id: messages}`` snapshot (reads every message)"""
+        sessions: Dict[str, List[Message]] = {}
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT session_id, role, content, ts FROM messages ORDER BY session_id, seq"
+            ).fetchall()
+        for row in rows:
+            sessions.setdefault(row["session_id"], []).append(Message(row["role"], row["content"], row["ts"]))
+        return sessions
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._migrate(self._conn)
+        return self._conn
+
+    def _migrate(self, conn) -> None:
+        with write_transaction(conn) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    ts REAL,
+                    PRIMARY KEY (session_id, seq)
+                ) WITHOUT ROWID
+                """
+            )
+            _create_session_index(db)
+            row = db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row is None or int(row["value"]) < self.schema_version:
+                # Message timestamps were added in version 3
+                columns = {column["name"] for column in db.execute("PRAGMA table_info(messages)")}
+                if "ts" not in columns:
+                    db.execute("ALTER TABLE messages ADD COLUMN ts REAL")
+                # Databases from before the sessions table only have messages
+                self._index_sessions(db)
+                db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                    (str(self.schema_version),)
+                )
+
+    @staticmethod
+    def _index_sessions(db) -> None:
+        """Rebuild session rows for sessions that have messages but no row"""
+        now = time.time()
+        db.execute(
+            """
+            INSERT INTO sessions (session_id, message_count, last_message, created, updated)
+            SELECT c.session_id, c.message_count, substr(m.content, 1, ?), ?, ?
+            FROM (SELECT session_id, COUNT(*) AS message_count, MAX(seq) AS last_seq
+                  FROM messages GROUP BY session_id) AS c
+            JOIN messages AS m ON m.session_id = c.session_id AND m.seq = c.last_seq
+            WHERE c.session_id NOT IN (SELECT session_id FROM sessions)
+            """,
+            (PREVIEW_CHARS, now, now)
+        )
+
+    def load(self) -> None:
+        with self._lock:
+            self._db()
+            if self.import_path and os.path.exists(self.import_path):
+                self._import_snapshot(self.import_path)
+        logger.info("✅ Opened chat history database: %s (%d sessions)", self.path, self.session_count())
+
+    def _import_snapshot(self, path: str) -> None:
+        # Checked inside the write transaction, so only the first worker imports
+        with write_transaction(self._db()) as db:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone():
+                return
+            db.execute("INSERT INTO meta (key, value) VALUES ('imported', ?)", (path,))
+            if db.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+                return
+            sessions = _read_snapshot(path)
+            db.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (session_id, seq, message.role, message.content, message.ts)
+                    for session_id, messages in sessions.items()
+                    for seq, message in enumerate(messages)
+                )
+            )
+            self._index_sessions(db)
+        if sessions:
+            logger.info("📥 Imported %d sessions from %s", len(sessions), path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_messages(self, session_id: str) -> List[Message]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT role, content, ts FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [Message(row["role"], row["content"], row["ts"]) for row in rows]
+
+    def get_messages_page(
+        self, session_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor)[0] if cursor else -1
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT seq, role, content, ts FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (session_id, after, limit + 1)
+            ).fetchall()
+        page = [
+            dict(Message(row["role"], row["content"], row["ts"]).to_dict(), seq=row["seq"])
+            for row in rows[:limit]
+        ]
+        next_cursor = encode_cursor(page[-1]["seq"]) if len(rows) > limit else None
+        return page, next_cursor
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._db().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def session_count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def append_message(self, session_id: str, role: str, content: str) -> Message:
+        message = Message.new(role, content)
+        now = message.ts
+        with self._lock, write_transaction(self._db()) as db:
+            row = db.execute("SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            seq = row["message_count"] if row else 0
+            db.execute(
+                "INSERT INTO messages (session_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, message.role, content, now)
+            )
+            if row:
+                db.execute(
+                    "UPDATE sessions SET message_count = ?, last_message = ?, updated = ? WHERE session_id = ?",
+                    (seq + 1, content[:PREVIEW_CHARS], now, session_id)
+                )
+            else:
+                db.execute(
+                    "INSERT INTO sessions (session_id, message_count, last_message, created, updated) "
+                    "VALUES (?, 1, ?, ?, ?)",
+                    (session_id, content[:PREVIEW_CHARS], now, now)
+                )
+        return message
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock, write_transaction(self._db()) as db:
+            deleted = db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        return deleted > 0
+
+    def clear(self) -> int:
+        with self._lock, write_transaction(self._db()) as db:
+            session_count = db.execute("DELETE FROM sessions").rowcount
+            db.execute("DELETE FROM messages")
+        return session_count
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return _list_indexed_sessions(self._db())
+
+    def list_sessions_page(
+        self, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        with self._lock:
+            return _page_indexed_sessions(self._db(), cursor, limit)
+
+
+class ShardedHistoryStore(HistoryStore):
+    """
+    One file per session, loaded on first access into a bounded cache
+
+    Startup does not read any history: a session's file is parsed the first
+    time it is used and kept in an LRU cache capped at ``max_cache_bytes``
+    (estimated). Sessions idle for ``idle_seconds`` are dropped from the
+    cache and, with ``compress_cold``, their file is gzip-compressed; an
+    append to a compressed session adds a gzip member, so the file never
+    has to be rewritten to stay writable.
+
+    Files are JSON lines (one message per line) under
+    ``<root>/<2 hex chars>/<encoded session id>.jsonl[.gz]``; a torn final
+    line left by a crash mid-write is ignored on load. The first ``load``
+    imports an existing snapshot (and append log) from ``import_path``.
+
+    Listings are served from ``<root>/index.db``, a SQLite table with each
+    session's message count, last-message preview and created/updated
+    times, updated on every append. Pages are read by key, so listing never
+    opens session files. Existing shards are indexed once on the first
+    ``load``; a row that fell behind its file (crash between the two
+    writes) is corrected the next time the session is read.
+
+    The cache is per process and compressing an idle session rewrites its
+    file from the cache, so the shards must have a single owner: ``load``
+    takes an exclusive lock on ``<root>/.lock`` and fails if another process
+    (e.g. a second uvicorn worker) holds it. Use the ``sqlite`` backend with
+    several workers.
+    """
+
+    backend_name = "sharded"
+
+    def __init__(
+        self,
+        root: str = "chat_history_sessions",
+        import_path: Optional[str] = None,
+        max_cache_bytes: int = DEFAULT_CACHE_BYTES,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+        compress_cold: bool = True
+    ):
+        self._lock = threading.RLock()
+        self.root = root
+        self.import_path = import_path
+        self.max_cache_bytes = max_cache_bytes
+        self.idle_seconds = idle_seconds
+        self.compress_cold = compress_cold
+        self.index_path = os.path.join(root, "index.db")
+        self._conn = None
+        self._owner_lock = None
+        # session_id -> [messages, estimated bytes, last access]
+        self._cache: "OrderedDict[str, list]" = OrderedDict()
+        self._cache_bytes = 0
+        self._next_sweep = 0.0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.compressed = 0
+
+    @property
+    def sessions(self) -> Dict[str, List[Message]]:
+        """Full ``{session_id: messages}`` snapshot (reads every session file)"""
+        return {session_id: self.get_messages(session_id) for session_id in self._session_ids()}
+
+    def load(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        self._lock_root()
+        marker = os.path.join(self.root, ".imported")
+        if self.import_path and not os.path.exists(marker):
+            self._import_legacy(self.import_path)
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write(self.import_path)
+        with self._lock:
+            self._build_index()
+        logger.info("✅ Chat history shards ready in %s (loaded on demand)", self.root)
+
+    def _import_legacy(self, path: str) -> None:
+        legacy = AppendLogHistoryStore(path)
+        if not os.path.exists(path) and not os.path.exists(legacy.log_path):
+            return
+        legacy.load()
+        legacy.close()
+        for session_id, messages in legacy.sessions.items():
+            self._write_shard(session_id, messages)
+        logger.info("📥 Imported %d sessions from %s into %s", len(legacy.sessions), path, self.root)
+
+    def _lock_root(self) -> None:
+        """Hold an exclusive lock on the shard directory until ``close``"""
+        if not FCNTL_AVAILABLE or self._owner_lock is not None:
+            return
+        handle = open(os.path.join(self.root, ".lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            raise RuntimeError(
+                f"Chat history shards in {self.root} are already open in another worker or store; the sharded "
+                "backend supports a single worker (set CHAT_HISTORY_BACKEND=sqlite for several)"
+            )
+        self._owner_lock = handle
+
+    # Files
+
+    def _shard_path(self, session_id: str) -> str:
+        bucket = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:2]
+        name = base64.urlsafe_b64encode(session_id.encode("utf-8")).decode().rstrip("=")
+        return os.path.join(self.root, bucket, name + ".jsonl")
+
+    @staticmethod
+    def _session_id_from_name(name: str) -> str:
+        encoded = name.split(".", 1)[0]
+        return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+
+    def _session_ids(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        session_ids = []
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir():
+                session_ids.extend(
+                    self._session_id_from_name(entry.name) for entry in os.scandir(bucket.path)
+                    if entry.name.endswith((".jsonl", ".jsonl.gz"))
+                )
+        return session_ids
+
+    def _existing_file(self, session_id: str) -> Optional[str]:
+        path = self._shard_path(session_id)
+        if os.path.exists(path):
+            return path
+        if os.path.exists(path + ".gz"):
+            return path + ".gz"
+        return None
+
+    def _read_shard(self, session_id: str) -> List[Message]:
+        path = self._existing_file(session_id)
+        if path is None:
+            return []
+        opener = gzip.open if path.endswith(".gz") else open
+        messages = []
+        good_offset = 0
+        intact = False
+        with opener(path, "rb") as f:
+            try:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        messages.append(Message.from_dict(json.loads(line)))
+                    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                        break
+                    good_offset += len(line)
+                else:
+                    intact = True
+            except (EOFError, gzip.BadGzipFile, zlib.error):
+                # Truncated or corrupt gzip member left by a crash mid-append
+                pass
+        if not intact:
+            self._repair_shard(session_id, path, messages, good_offset)
+        return messages
+
+    def _repair_shard(self, session_id: str, path: str, messages: List[Message], good_offset: int) -> None:
+        """Drop a damaged tail now, or the next append would be written after it and lost"""
+        if path.endswith(".gz"):
+            logger.warning(
+                "⚠️ Rewriting damaged compressed chat history for %s (%d messages kept)", session_id, len(messages)
+            )
+            self._write_shard(session_id, messages, compress=True)
+            return
+        logger.warning(
+            "⚠️ Discarding %d bytes of incomplete chat history for %s",
+            os.path.getsize(path) - good_offset, session_id
+        )
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+
+    def _write_shard(self, session_id: str, messages: List[Message], compress: bool = False) -> None:
+        path = self._shard_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        target = path + ".gz" if compress else path
+        tmp_path = target + ".tmp"
+        data = b"".join(_json_line(message) for message in messages)
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(data) if compress else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+        # Only one form of the file may exist
+        stale = path if compress else path + ".gz"
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def _append_shard(self, session_id: str, message: Message) -> None:
+        path = self._existing_file(session_id) or self._shard_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path.endswith(".gz"):
+            # A new gzip member; readers see the concatenation
+            with open(path, "ab") as f:
+                f.write(gzip.compress(_json_line(message)))
+        else:
+            with open(path, "ab") as f:
+                f.write(_json_line(message))
+
+    # Index
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.index_path)
+            _create_session_index(self._conn)
+        return self._conn
+
+    def _build_index(self) -> None:
+        """Index shards written before the index existed (once)"""
+        db = self._db()
+        if db.execute("SELECT 1 FROM meta WHERE key = 'indexed'").fetchone():
+            return
+        started = time.perf_counter()
+        session_ids = self._session_ids()
+        with write_transaction(db):
+            for session_id in session_ids:
+                self._index_session(session_id, self._read_shard(session_id))
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed', ?)", (str(time.time()),))
+        logger.info(
+            "🗂️ Indexed %d chat history sessions in %.0f ms",
+            len(session_ids), (time.perf_counter() - started) * 1000
+        )
+
+    def _index_session(self, session_id: str, messages: List[Message]) -> None:
+        """Write a session's index row from its messages"""
+        if not messages:
+            self._db().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            return
+        path = self._existing_file(session_id)
+        fallback = os.path.getmtime(path) if path else time.time()
+        self._db().execute(
+            "INSERT INTO sessions (session_id, message_count, last_message, created, updated) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET "
+            "message_count = excluded.message_count, last_message = excluded.last_message, "
+            "updated = excluded.updated",
+            (
+                session_id, len(messages), messages[-1].content[:PREVIEW_CHARS],
+                messages[0].ts or fallback, messages[-1].ts or fallback
+            )
+        )
+
+    def _check_index(self, session_id: str, messages: List[Message]) -> None:
+        row = self._db().execute(
+            "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or row["message_count"] != len(messages):
+            self._index_session(session_id, messages)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._owner_lock is not None:
+                # Closing the file releases the lock
+                self._owner_lock.close()
+                self._owner_lock = None
+
+    # Cache
+
+    def _cached(self, session_id: str, create: bool = False) -> List[Message]:
+        now = time.monotonic()
+        entry = self._cache.get(session_id)
+        if entry is not None:
+            self.hits += 1
+            entry[2] = now
+            self._cache.move_to_end(session_id)
+            return entry[0]
+        if not create and self._existing_file(session_id) is None:
+            # Misses are not cached, so unknown ids never start to look like sessions
+            return []
+        messages = self._read_shard(session_id)
+        self._check_index(session_id, messages)
+        self.loads += 1
+        size = sum(_message_bytes(message) for message in messages)
+        self._cache[session_id] = [messages, size, now]
+        self._cache_bytes += size
+        self._evict(now, keep=session_id)
+        return messages
+
+    def _evict(self, now: float, keep: Optional[str] = None) -> None:
+        if now >= self._next_sweep:
+            self._next_sweep = now + min(self.idle_seconds, 60.0)
+            idle = [session_id for session_id, entry in self._cache.items()
+                    if now - entry[2] >= self.idle_seconds and session_id != keep]
+            for session_id in idle:
+                self._drop(session_id, cold=True)
+        while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+            session_id = next(iter(self._cache))
+            if session_id == keep:
+                self._cache.move_to_end(session_id)
+                continue
+            self._drop(session_id, cold=False)
+
+    def _drop(self, session_id: str, cold: bool) -> None:
+        messages, size, _ = self._cache.pop(session_id)
+        self._cache_bytes -= size
+        self.evictions += 1
+        if cold and self.compress_cold and messages:
+            path = self._existing_file(session_id)
+            if path and not path.endswith(".gz"):
+                try:
+                    self._write_shard(session_id, messages, compress=True)
+                    self.compressed += 1
+                except OSError as e:
+                    logger.error("❌ Error compressing chat history for %s: %s", session_id, e)
+
+    def evict_idle(self) -> None:
+        """Drop (and compress) sessions idle for ``idle_seconds`` now"""
+        with self._lock:
+            self._next_sweep = 0.0
+            self._evict(time.monotonic())
+
+    # HistoryStore API
+
+    def get_messages(self, session_id: str) -> List[Message]:
+        with self._lock:
+            return self._cached(session_id)
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._existing_file(session_id) is not None
+
+    def session_count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def append_message(self, session_id: str, role: str, content: str) -> Message:
+        message = Message.new(role, content)
+        with self._lock:
+            messages = self._cached(session_id, create=True)
+            self._append_shard(session_id, message)
+            messages.append(message)
+            self._db().execute(
+                "INSERT INTO sessions (session_id, message_count, last_message, created, updated) "
+                "VALUES (?, 1, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                "message_count = message_count + 1, last_message = excluded.last_message, "
+                "updated = excluded.updated",
+                (session_id, content[:PREVIEW_CHARS], message.ts, message.ts)
+            )
+            entry = self._cache[session_id]
+            entry[1] += _message_bytes(message)
+            self._cache_bytes += _message_bytes(message)
+            self._evict(time.monotonic(), keep=session_id)
+        return message
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._cache.pop(session_id, None)
+            if entry is not None:
+                self._cache_bytes -= entry[1]
+            self._db().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            path = self._existing_file(session_id)
+            if path is None:
+                return False
+            os.remove(path)
+        return True
+
+    def clear(self) -> int:
+        with self._lock:
+            session_ids = self._session_ids()
+            for session_id in session_ids:
+                path = self._existing_file(session_id)
+                if path:
+                    os.remove(path)
+            self._cache.clear()
+            self._cache_bytes = 0
+            self._db().execute("DELETE FROM sessions")
+        return len(session_ids)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return _list_indexed_sessions(self._db())
+
+    def list_sessions_page(
+        self, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        with self._lock:
+            return _page_indexed_sessions(self._db(), cursor, limit)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "cached_sessions": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+            "max_cache_bytes": self.max_cache_bytes,
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "compressed": self.compressed,
+        }
+
+
+def _create_session_index(db) -> None:
+    """Per-session metadata (count, preview, created/updated) listings are served from"""
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            last_message TEXT NOT NULL,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS sessions_by_created ON sessions (created, session_id)")
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _list_indexed_sessions(db) -> List[Dict[str, Any]]:
+    rows = db.execute("SELECT * FROM sessions ORDER BY created, session_id").fetchall()
+    return [_row_summary(row) for row in rows]
+
+
+def _page_indexed_sessions(
+    db, cursor: Optional[str], limit: int
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Keyset page of the ``sessions`` table, oldest first"""
+    if cursor:
+        created, session_id = decode_cursor(cursor)
+        rows = db.execute(
+            "SELECT * FROM sessions WHERE (created, session_id) > (?, ?) "
+            "ORDER BY created, session_id LIMIT ?",
+            (created, session_id, limit + 1)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            "SELECT * FROM sessions ORDER BY created, session_id LIMIT ?", (limit + 1,)
+        ).fetchall()
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]["created"], page[-1]["session_id"]) if len(rows) > limit else None
+    return [_row_summary(row) for row in page], next_cursor
+
+
+def _row_summary(row) -> Dict[str, Any]:
+    return {
+        "session_id": row["session_id"],
+        "message_count": row["message_count"],
+        "last_message": row["last_message"] + "...",
+        "created": row["created"],
+        "updated": row["updated"],
+    }
+
+
+def _json_line(message: Message) -> bytes:
+    return (message.to_json() + "\n").encode("utf-8")
+
+
+def _message_bytes(message: Message) -> int:
+    # Estimated in-memory size: text plus record/str object overhead (roles are shared)
+    return len(message.content) + 140
+
+
+def _read_snapshot(path: str) -> Dict[str, List[Message]]:
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return {
+                    session_id: [Message.from_dict(message) for message in messages]
+                    for session_id, messages in json.load(f).items()
+                }
+        logger.info("📝 No existing chat history file found, starting fresh")
+    except Exception as e:
+        logger.error("⚠️ Error loading chat history: %s", e)
+    return {}
+
+
+def _write_snapshot(path: str, sessions: Dict[str, List[Message]]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(
+            {session_id: [message.to_dict() for message in messages] for session_id, messages in sessions.items()},
+            f, indent=2, ensure_ascii=False
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+HISTORY_BACKENDS = {
+    "json": JsonHistoryStore,
+    "log": AppendLogHistoryStore,
+    "sqlite": SQLiteHistoryStore,
+    "sharded": ShardedHistoryStore,
+}
+
+
+def create_history_store(path: str = "chat_history.json", backend: Optional[str] = None) -> HistoryStore:
+    """
+    Build the history store selected by ``backend`` or the
+    ``CHAT_HISTORY_BACKEND`` environment variable (default: ``sharded``)
+
+    The ``sqlite`` backend stores its database next to ``path`` (same name,
+    ``.db`` extension) unless ``CHAT_HISTORY_DB`` is set; the ``sharded``
+    backend keeps its files in a ``<name>_sessions`` directory next to
+    ``path``. Both import an existing ``path`` snapshot on first use.
+    """
+    backend = (backend or os.getenv("CHAT_HISTORY_BACKEND", "sharded")).lower()
+    store_cls = HISTORY_BACKENDS.get(backend)
+    if store_cls is None:
+        logger.warning("⚠️ Unknown chat history backend '%s', using 'sharded'", backend)
+        store_cls = ShardedHistoryStore
+    if store_cls is SQLiteHistoryStore:
+        return store_cls(os.getenv("CHAT_HISTORY_DB") or os.path.splitext(path)[0] + ".db", import_path=path)
+    if store_cls is ShardedHistoryStore:
+        return store_cls(
+            os.path.splitext(path)[0] + "_sessions",
+            import_path=path,
+            max_cache_bytes=int(float(os.getenv("CHAT_HISTORY_CACHE_MB", "64")) * 1024 * 1024),
+            idle_seconds=float(os.getenv("CHAT_HISTORY_IDLE_SECONDS", str(DEFAULT_IDLE_SECONDS))),
+            compress_cold=os.getenv("CHAT_HISTORY_COMPRESS", "true").lower() in ("1", "true", "yes")
+        )
+    return store_cls(path)
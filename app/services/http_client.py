@@ -0,0 +1,278 @@
+"""
+Shared async HTTP client for outbound API calls (Gemini, Murf, AssemblyAI)
+
+A single aiohttp session is reused for the whole process so connections are
+kept alive and pooled instead of paying a TCP/TLS handshake per request.
+"""
+import asyncio
+import json
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses meaning the request was rejected before being processed
+REJECTED_STATUSES = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HttpStatusError(Exception):
+    """Raised when a response has an error status code"""
+
+    def __init__(self, status: int, url: str, body: bytes = b""):
+        self.status = status
+        self.url = url
+        self.body = body
+        super().__init__(f"HTTP {status} from {url}")
+
+
+class HttpResponse:
+    """Fully read HTTP response"""
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, url: str):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise HttpStatusError(self.status, self.url, self.body)
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of overall traffic
+
+    Every request deposits ``ratio`` tokens and every retry withdraws one, so
+    when an upstream is down we stop amplifying load with retries instead of
+    multiplying it.
+    """
+
+    def __init__(self, ratio: float = 0.2, initial: float = 10.0, cap: float = 50.0):
+        self.ratio = ratio
+        self.tokens = initial
+        self.cap = cap
+
+    def record_request(self) -> None:
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class HttpClient:
+    """
+    Args:
+        limit: Connections open at once across all hosts
+        limit_per_host: Buffered requests in flight per host (``host_limits``
+            overrides it for individual hosts)
+        stream_limit_per_host: Streaming responses open at once per host.
+            Streams hold their connection for the whole response, so they
+            get their own slots and never queue short requests behind them
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 16,
+        stream_limit_per_host: int = 64,
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        keepalive_timeout: float = 30.0,
+        host_limits: Optional[Dict[str, int]] = None
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.stream_limit_per_host = stream_limit_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.keepalive_timeout = keepalive_timeout
+        self.host_limits = host_limits or {}
+        self.retry_budget = RetryBudget()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stream_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Room for both kinds of request; the semaphores enforce each limit
+            connector = aiohttp.TCPConnector(
+                limit=max(self.limit, self.limit_per_host + self.stream_limit_per_host),
+                limit_per_host=self.limit_per_host + self.stream_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout(self.timeout),
+            )
+        return self._session
+
+    def _timeout(self, total: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=total, connect=self.connect_timeout)
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.limit_per_host))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _stream_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        semaphore = self._stream_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.stream_limit_per_host)
+            self._stream_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        idempotent: Optional[bool] = None,
+        **kwargs
+    ) -> HttpResponse:
+        """
+        Send a request and read the full body, retrying transient failures
+
+        A request that timed out or lost its connection may already have been
+        processed, so it is only retried when it is idempotent. Otherwise
+        only failures to connect and 429/503 rejections are retried, so a
+        POST to Gemini or Murf is never billed twice.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            timeout: Total timeout in seconds (defaults to the client timeout)
+            retries: Maximum retries (defaults to the client setting)
+            idempotent: Whether repeating the request is safe (defaults to
+                True for GET, HEAD, OPTIONS, PUT and DELETE)
+            **kwargs: Passed through to ``aiohttp.ClientSession.request``
+
+        Returns:
+            HttpResponse: Response with status, headers and body
+        """
+        session = self._get_session()
+        max_retries = self.max_retries if retries is None else retries
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        self.retry_budget.record_request()
+        attempt = 0
+
+        while True:
+            try:
+                async with self._host_semaphore(url):
+                    async with session.request(
+                        method, url, timeout=self._timeout(timeout or self.timeout), **kwargs
+                    ) as resp:
+                        body = await resp.read()
+                        response = HttpResponse(resp.status, dict(resp.headers), body, str(resp.url))
+                if response.status not in retry_statuses:
+                    return response
+                error: Exception = HttpStatusError(response.status, url, body)
+            except aiohttp.ClientConnectorError as e:
+                # The connection was never established, so nothing was sent
+                error = e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not idempotent:
+                    raise
+                error = e
+
+            if attempt >= max_retries or not self.retry_budget.try_spend():
+                if isinstance(error, HttpStatusError):
+                    return response
+                raise error
+
+            attempt += 1
+            delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+            logger.warning("⚠️ Retrying %s %s in %.2fs (attempt %d): %s", method, url, delay, attempt, error)
+            await asyncio.sleep(delay)
+
+    async def post_json(self, url: str, **kwargs):
+        """POST and return the decoded JSON body, raising on error statuses"""
+        response = await self.request("POST", url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_bytes(self, url: str, **kwargs) -> bytes:
+        """GET and return the raw body, raising on error statuses"""
+        response = await self.request("GET", url, **kwargs)
+        response.raise_for_status()
+        return response.body
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Open a streaming request; the body is read by the caller
+
+        Streaming requests are not retried since part of the body may
+        already have been consumed. They count against
+        ``stream_limit_per_host`` rather than the per-host request limit.
+        """
+        session = self._get_session()
+        self.retry_budget.record_request()
+        async with self._stream_semaphore(url):
+            async with session.request(
+                method, url, timeout=self._timeout(timeout or self.timeout), **kwargs
+            ) as resp:
+                if resp.status >= 400:
+                    raise HttpStatusError(resp.status, url, await resp.read())
+                yield resp
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    """Get the process-wide HTTP client"""
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the process-wide HTTP client (call on shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
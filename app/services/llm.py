@@ -2,12 +2,13 @@
 Gemini LLM service with streaming support
 """
 import os
-import json
 import logging
-import requests
 import asyncio
 from typing import Dict, List, AsyncGenerator, Optional, Union
 
+from .http_client import get_http_client
+from ..utils.stream_parser import StreamEventParser, extract_text
+
 logger = logging.getLogger(__name__)
 
 class GeminiService:
@@ -18,9 +19,11 @@ class GeminiService:
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
 
     async def _convert_messages(self, messages: List[Dict[str, str]]) -> List[Dict]:
-        """Convert messages to Gemini format"""
+        """Convert messages to Gemini format (``system`` messages are sent separately)"""
         gemini_messages = []
         for msg in messages:
+            if msg["role"] == "system":
+                continue
             role = "user" if msg["role"] == "user" else "model"
             gemini_messages.append({
                 "role": role,
@@ -28,6 +31,20 @@ class GeminiService:
             })
         return gemini_messages
 
+    async def _build_payload(self, messages: List[Dict[str, str]], max_length: int) -> Dict:
+        """Request body for ``messages``; ``system`` messages become the system instruction"""
+        payload = {
+            "contents": await self._convert_messages(messages),
+            "generationConfig": {
+                "maxOutputTokens": max_length,
+                "temperature": 0.7,
+            }
+        }
+        system = "\n\n".join(msg["content"] for msg in messages if msg["role"] == "system")
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        return payload
+
     async def generate_response(
         self,
         messages: List[Dict[str, str]],
@@ -49,8 +66,6 @@ class GeminiService:
         if not self.api_key:
             raise RuntimeError("Gemini API key missing")
 
-        gemini_messages = await self._convert_messages(messages)
-        
         if stream:
             return self._stream_response_requests(messages, max_length)
         else:
@@ -61,23 +76,14 @@ class GeminiService:
         messages: List[Dict[str, str]],
         max_length: int
     ) -> str:
-        """Get complete response using requests library"""
-        gemini_messages = await self._convert_messages(messages)
+        """Get complete response using the shared async HTTP client"""
         url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
         headers = {"Content-Type": "application/json"}
         params = {"key": self.api_key}
-        payload = {
-            "contents": gemini_messages,
-            "generationConfig": {
-                "maxOutputTokens": max_length,
-                "temperature": 0.7,
-            }
-        }
+        payload = await self._build_payload(messages, max_length)
         
         try:
-            response = requests.post(url, headers=headers, params=params, json=payload, timeout=60)
-            response.raise_for_status()
-            data = response.json()
+            data = await get_http_client().post_json(url, headers=headers, params=params, json=payload, timeout=60)
             
             if not data.get("candidates"):
                 raise RuntimeError("No response from Gemini API")
@@ -90,58 +96,45 @@ class GeminiService:
     async def _stream_response_requests(
         self,
         messages: List[Dict[str, str]],
-        max_length: int
+        max_length: int,
+        cancel_event: Optional[asyncio.Event] = None
     ) -> AsyncGenerator[str, None]:
-        """Stream response using requests library"""
-        gemini_messages = await self._convert_messages(messages)
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent"
+        """
+        Stream response chunks without blocking the event loop
+
+        The body is read with the shared aiohttp client and parsed
+        incrementally, so partial lines split across network reads are
+        reassembled before decoding. Setting ``cancel_event`` (or cancelling
+        the consuming task / calling ``aclose()``) stops the stream and
+        releases the connection.
+        """
+        url = f"{self.base_url}/models/gemini-1.5-flash:streamGenerateContent"
         headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
-        payload = {
-            "contents": gemini_messages,
-            "generationConfig": {
-                "maxOutputTokens": max_length,
-                "temperature": 0.7,
-            }
-        }
+        params = {"key": self.api_key, "alt": "sse"}
+        payload = await self._build_payload(messages, max_length)
         
+        parser = StreamEventParser()
         try:
-            # Use requests in a thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            
-            def make_request():
-                return requests.post(url, headers=headers, params=params, json=payload, stream=True, timeout=60)
-            
-            response = await loop.run_in_executor(None, make_request)
-            response.raise_for_status()
-            
-            buffer = ""
-            for line in response.iter_lines(decode_unicode=True):
-                if not line:
-                    continue
-                    
-                if line.startswith("data: "):
-                    chunk_data = line[6:]
-                    if chunk_data == "[DONE]":
+            async with get_http_client().stream(
+                "POST", url, headers=headers, params=params, json=payload, timeout=60
+            ) as response:
+                async for data in response.content.iter_any():
+                    if cancel_event is not None and cancel_event.is_set():
+                        logger.info("🛑 Gemini stream cancelled")
+                        return
+                    for event in parser.feed(data):
+                        text = extract_text(event)
+                        if text:
+                            yield text
+                    if parser.done:
                         break
-                        
-                    try:
-                        data = json.loads(chunk_data)
-                        if "candidates" in data and data["candidates"]:
-                            parts = data["candidates"][0].get("content", {}).get("parts", [])
-                            if parts and "text" in parts[0]:
-                                text = parts[0]["text"]
-                                if text.startswith(buffer):
-                                    new_content = text[len(buffer):]
-                                    if new_content:
-                                        yield new_content
-                                        buffer = text
-                                else:
-                                    yield text
-                                    buffer = text
-                    except json.JSONDecodeError:
-                        continue
-                        
+                for event in parser.close():
+                    text = extract_text(event)
+                    if text:
+                        yield text
+        except asyncio.CancelledError:
+            logger.info("🛑 Gemini stream cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error in streaming Gemini API request: {e}")
             raise RuntimeError(f"Failed to stream response: {str(e)}")
@@ -149,64 +142,41 @@ class GeminiService:
     async def generate_streaming_response(
         self,
         messages: List[Dict[str, str]],
-        max_length: int = 3000
+        max_length: int = 3000,
+        cancel_event: Optional[asyncio.Event] = None
     ) -> AsyncGenerator[str, None]:
         """Convenience method for streaming responses"""
-        return await self.generate_response(messages, max_length, stream=True)
+        if not self.api_key:
+            raise RuntimeError("Gemini API key missing")
 
-    async def stream_response(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        async for chunk in self._stream_response_requests(messages, max_length, cancel_event):
+            yield chunk
+
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        cancel_event: Optional[asyncio.Event] = None
+    ) -> AsyncGenerator[str, None]:
         """
         Stream a response using the Gemini streaming API.
         Yields incremental text chunks as they arrive.
         """
-        if not self.api_key:
-            raise RuntimeError("Gemini API key missing")
+        async for chunk in self.generate_streaming_response(messages, cancel_event=cancel_event):
+            yield chunk
 
-        # Convert messages to Gemini format
-        gemini_messages = await self._convert_messages(messages)
-        url = f"{self.base_url}/models/gemini-1.5-flash:streamGenerateContent"
-        gemini_messages = []
-        for msg in messages:
-            role = "user" if msg["role"] == "user" else "model"
-            gemini_messages.append({"role": role, "parts": [{"text": msg["content"]}]})
-
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent"
-        headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
-        payload = {"contents": gemini_messages}
-
-        try:
-            with requests.post(url, headers=headers, params=params, json=payload, stream=True, timeout=60) as resp:
-                resp.raise_for_status()
-                for raw_line in resp.iter_lines(decode_unicode=True):
-                    if not raw_line:
-                        continue
-                    try:
-                        data = json.loads(raw_line)
-                    except json.JSONDecodeError:
-                        # Some transports may prefix lines; try to strip known prefixes
-                        line = raw_line.strip()
-                        if line.startswith("data: "):
-                            try:
-                                data = json.loads(line[len("data: "):])
-                            except Exception:
-                                continue
-                        else:
-                            continue
+    async def summarize(self, summary: str, messages: List[Dict[str, str]], max_length: int = 400) -> str:
+        """
+        Fold ``messages`` into a running conversation ``summary``
 
-                    # Extract text chunks from streaming events
-                    try:
-                        candidates = data.get("candidates") or []
-                        if not candidates:
-                            continue
-                        parts = candidates[0].get("content", {}).get("parts", [])
-                        for part in parts:
-                            text: Optional[str] = part.get("text")
-                            if text:
-                                yield text
-                    except Exception:
-                        # Ignore malformed events and continue streaming
-                        continue
-        except Exception as e:
-            logger.error("Error in Gemini streaming service: %s", str(e))
-            raise
+        Used by the context window to summarize turns that no longer fit
+        verbatim; only the new messages are sent, not the whole history.
+        """
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+        )
+        prompt = (
+            "Update the summary of a conversation between a user and a voice assistant. "
+            "Keep facts, names, preferences and open questions; be brief.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}\n\nUpdated summary:"
+        )
+        return await self.generate_response([{"role": "user", "content": prompt}], max_length=max_length)
@@ -3,11 +3,16 @@ Handles HTTP streaming connection to Murf API for real-time audio generation
 Updated to use official Murf SDK instead of deprecated WebSocket endpoints
 """
 import asyncio
+import inspect
 import json
 import logging
 import base64
-from typing import Optional, Callable
+from typing import Optional, Callable, Iterator
 import uuid
+
+from .tts_cache import get_tts_cache
+from .tts_pipeline import TTS_MAX_CONCURRENCY, TTSPipeline, iterate_in_thread
+
 try:
     from murf import Murf
     MURF_SDK_AVAILABLE = True
@@ -17,15 +22,28 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Cache format tag for clips produced by the SDK streaming endpoint
+STREAM_CACHE_FORMAT = "stream"
+
 class MurfStreamingService:
-    def __init__(self, api_key: str, voice_id: str = "en-US-natalie"):
+    def __init__(
+        self,
+        api_key: str,
+        voice_id: str = "en-US-natalie",
+        audio_format: Optional[str] = None,
+        mock_fallback: bool = True
+    ):
         self.api_key = api_key
         self.voice_id = voice_id
+        self.audio_format = audio_format
+        self.mock_fallback = mock_fallback
         self.websocket = None
         self.context_id = str(uuid.uuid4())  # Static context ID to avoid context limit errors
         self.is_connected = False
+        self.murf_client = None
         self.audio_callback: Optional[Callable[[str], None]] = None
         self.websocket_callback: Optional[Callable[[str], None]] = None
+        self.raw_audio_callback: Optional[Callable[[bytes], None]] = None
         
     async def connect(self):
         """Initialize Murf HTTP Streaming API connection"""
@@ -52,60 +70,97 @@ class MurfStreamingService:
     
     # HTTP streaming handles responses directly in send_text_chunk - removed _handle_message
     
+    def synthesize_stream(self, text: str) -> Iterator[bytes]:
+        """
+        Blocking generator of audio chunks for ``text`` (run it off the event loop)
+
+        Complete clips are cached, so repeated phrases skip the Murf request.
+        Falls back to mock audio (unless ``mock_fallback`` is off) when the
+        SDK is unavailable or the request fails before any audio was produced.
+        Without the fallback, synthesizing on a closed connection raises.
+        """
+        if self.is_connected and MURF_SDK_AVAILABLE and self.murf_client is not None:
+            cache = get_tts_cache()
+            cache_format = STREAM_CACHE_FORMAT + (f"-{self.audio_format.lower()}" if self.audio_format else "")
+            cached = cache.get(text, self.voice_id, cache_format)
+            if cached is not None:
+                yield cached
+                return
+
+            options = {"format": self.audio_format} if self.audio_format else {}
+            chunks = []
+            try:
+                # Use official Murf SDK for HTTP streaming
+                for audio_chunk in self.murf_client.text_to_speech.stream(
+                    text=text,
+                    voice_id=self.voice_id,
+                    **options
+                ):
+                    chunks.append(audio_chunk)
+                    yield audio_chunk
+                cache.put(text, self.voice_id, cache_format, b"".join(chunks))
+                return
+            except Exception as e:
+                logger.error(f"❌ Failed to stream text with Murf: {e}")
+                if chunks:
+                    return
+
+        if not self.mock_fallback:
+            if not self.is_connected:
+                raise RuntimeError("Murf connection is closed")
+            return
+
+        # Mock audio generation for testing when Murf is not available
+        logger.info(f"🎭 Mock TTS: '{text}'")
+        yield f"MOCK_AUDIO_DATA_{text[:20]}".encode()
+
+    async def _emit_audio(self, audio_chunk: bytes):
+        """Hand an audio chunk to the registered callbacks (raw bytes, then base64)"""
+        if self.raw_audio_callback:
+            result = self.raw_audio_callback(audio_chunk)
+            if inspect.isawaitable(result):
+                await result
+        
+        if not (self.websocket_callback or self.audio_callback):
+            return
+        
+        # Convert to base64 for consistency with existing pipeline
+        audio_base64 = base64.b64encode(audio_chunk).decode()
+        
+        # Send to WebSocket client if callback is set (Day 21)
+        for callback in (self.websocket_callback, self.audio_callback):
+            if callback:
+                result = callback(audio_base64)
+                if inspect.isawaitable(result):
+                    await result
+
+    def create_pipeline(self, max_concurrency: int = TTS_MAX_CONCURRENCY) -> TTSPipeline:
+        """
+        Create a pipelined TTS stage for one response
+
+        Segments submitted to the pipeline are synthesized concurrently and
+        their audio is passed to the callbacks in submission order.
+        """
+        pipeline = TTSPipeline(self.synthesize_stream, max_concurrency=max_concurrency)
+        pipeline.start(self._emit_audio)
+        return pipeline
+
     async def send_text_chunk(self, text: str, is_final: bool = False):
         """Send text chunk to Murf for TTS conversion using HTTP streaming"""
-        if not self.is_connected or not MURF_SDK_AVAILABLE:
-            # Mock audio generation for testing when Murf is not available
-            logger.info(f"🎭 Mock TTS: '{text}' (final: {is_final})")
-            
-            # Generate mock base64 audio data for testing
-            mock_audio = base64.b64encode(f"MOCK_AUDIO_DATA_{text[:20]}".encode()).decode()
-            
-            # Print mock base64 audio to console (Day 20 requirement)
-            print(f"[MURF AUDIO BASE64] {mock_audio}")
-            logger.info(f"🎵 Generated mock base64 audio chunk: {len(mock_audio)} characters")
-            
-            # Send to WebSocket client if callback is set (Day 21)
-            if self.websocket_callback:
-                self.websocket_callback(mock_audio)
-            
-            # Call audio callback if set
-            if self.audio_callback:
-                self.audio_callback(mock_audio)
-                
+        if not text or not text.strip():
             return True
-            
+
         try:
-            # Use official Murf SDK for HTTP streaming
-            res = self.murf_client.text_to_speech.stream(
-                text=text,
-                voice_id=self.voice_id
-            )
-            
-            # Process streaming audio chunks
-            for audio_chunk in res:
-                # Convert to base64 for consistency with existing pipeline
-                audio_base64 = base64.b64encode(audio_chunk).decode()
-                
-                # Print base64 audio to console (Day 20 requirement)
-                print(f"[MURF AUDIO BASE64] {audio_base64}")
-                logger.info(f"🎵 Received base64 audio chunk: {len(audio_base64)} characters")
-                
-                # Send to WebSocket client if callback is set (Day 21)
-                if self.websocket_callback:
-                    self.websocket_callback(audio_base64)
-                
-                # Call audio callback if set
-                if self.audio_callback:
-                    self.audio_callback(audio_base64)
+            # Iterate the blocking SDK stream on a worker thread
+            async for audio_chunk in iterate_in_thread(lambda: self.synthesize_stream(text)):
+                await self._emit_audio(audio_chunk)
             
             logger.info(f"📤 Completed streaming TTS for: '{text[:50]}...' (final: {is_final})")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to stream text with Murf: {e}")
-            # Fallback to mock on error
-            return await self.send_text_chunk(text, is_final)
+            return False
     
     async def clear_context(self):
         """Clear the current context (generate new context_id)"""
@@ -127,6 +182,10 @@ class MurfStreamingService:
         """Set callback function to send audio data to WebSocket client"""
         self.websocket_callback = websocket_callback
     
+    def set_raw_audio_callback(self, callback: Callable[[bytes], None]):
+        """Set callback function to receive raw audio bytes (no base64 encoding)"""
+        self.raw_audio_callback = callback
+    
     async def close(self):
         """Close the HTTP streaming connection"""
         try:
@@ -0,0 +1,172 @@
+"""
+Registry of live streaming sessions
+
+A /ws connection (its socket, recorder and STT stream) only exists in the
+worker process that accepted it, but which sessions are live, which worker
+owns them and their coarse state need to be visible from every worker when
+the app runs under several uvicorn workers. The registry holds that shared
+part as a small JSON record per session:
+
+- ``MemorySessionState`` keeps records in the process (single worker).
+- ``SQLiteSessionState`` keeps them in a SQLite database in WAL mode shared
+  by every worker on the host.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.utils.sqlite_db import connect, write_transaction
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker process in session records
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemorySessionState:
+    """Process-local registry"""
+
+    backend_name = "memory"
+
+    def __init__(self):
+        self._records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, session_id: str, **fields) -> dict:
+        """Create (or replace) the record for a session owned by this worker"""
+        now = time.time()
+        record = {"session_id": session_id, "owner": WORKER_ID, "created": now, "updated": now, **fields}
+        with self._lock:
+            self._records[session_id] = record
+        return dict(record)
+
+    def update(self, session_id: str, **fields) -> Optional[dict]:
+        """Merge ``fields`` into a session's record; returns None if it is not registered"""
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return None
+            record.update(fields, updated=time.time())
+            return dict(record)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._records.get(session_id)
+            return dict(record) if record else None
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._records.pop(session_id, None) is not None
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def prune(self, max_age: float) -> int:
+        """Drop records not updated for ``max_age`` seconds (left by crashed workers)"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [session_id for session_id, record in self._records.items() if record["updated"] < cutoff]
+            for session_id in stale:
+                del self._records[session_id]
+        return len(stale)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSessionState(MemorySessionState):
+    """
+    Registry shared by every worker through a SQLite database
+
+    Updates read, merge and write the record inside one ``BEGIN IMMEDIATE``
+    transaction, so concurrent updates from different workers never lose
+    each other's fields.
+    """
+
+    backend_name = "sqlite"
+
+    def __init__(self, path: str = "session_state.db"):
+        self._lock = threading.Lock()
+        self.path = path
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_state (
+                    session_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+        return self._conn
+
+    def register(self, session_id: str, **fields) -> dict:
+        now = time.time()
+        record = {"session_id": session_id, "owner": WORKER_ID, "created": now, "updated": now, **fields}
+        with self._lock, write_transaction(self._db()) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, owner, updated, data) VALUES (?, ?, ?, ?)",
+                (session_id, WORKER_ID, now, json.dumps(record))
+            )
+        return record
+
+    def update(self, session_id: str, **fields) -> Optional[dict]:
+        with self._lock, write_transaction(self._db()) as db:
+            row = db.execute("SELECT data FROM session_state WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            record = json.loads(row["data"])
+            record.update(fields, updated=time.time())
+            db.execute(
+                "UPDATE session_state SET updated = ?, data = ? WHERE session_id = ?",
+                (record["updated"], json.dumps(record), session_id)
+            )
+        return record
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db().execute("SELECT data FROM session_state WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock, write_transaction(self._db()) as db:
+            return db.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            rows = self._db().execute("SELECT data FROM session_state ORDER BY updated DESC").fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def prune(self, max_age: float) -> int:
+        with self._lock, write_transaction(self._db()) as db:
+            return db.execute("DELETE FROM session_state WHERE updated < ?", (time.time() - max_age,)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_session_state(backend: Optional[str] = None) -> MemorySessionState:
+    """
+    Build the registry selected by ``backend`` or the ``SESSION_STATE_BACKEND``
+    environment variable (``memory`` by default; use ``sqlite`` with several
+    workers, database path from ``SESSION_STATE_DB``)
+    """
+    backend = (backend or os.getenv("SESSION_STATE_BACKEND", "memory")).lower()
+    if backend == "sqlite":
+        return SQLiteSessionState(os.getenv("SESSION_STATE_DB", "session_state.db"))
+    if backend != "memory":
+        logger.warning("⚠️ Unknown session state backend '%s', using 'memory'", backend)
+    return MemorySessionState()
@@ -0,0 +1,194 @@
+"""
+Speculative LLM prefetch on stable partial transcripts
+
+End of turn is only declared after a stretch of silence, but the words of the
+turn usually stop changing well before that. Once a partial transcript has
+been unchanged for ``stable_ms`` the Gemini request is started speculatively
+and its output buffered. If the final transcript matches, the buffered reply
+is handed over the moment the turn ends; if the user keeps talking or the
+final differs, the speculative request is cancelled and a normal one runs.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+
+
+def normalize_transcript(text: str) -> str:
+    """Compare transcripts ignoring case, punctuation and spacing (formatted vs raw turns)"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+class _Speculation:
+    """One in-flight speculative request and its buffered output"""
+
+    def __init__(self, prompt: str, stream: AsyncIterator[str]):
+        self.prompt = prompt
+        self.key = normalize_transcript(prompt)
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._consume(stream))
+
+    @property
+    def chars(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    async def _consume(self, stream: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in stream:
+                if self.first_chunk_at is None:
+                    self.first_chunk_at = time.perf_counter()
+                self.chunks.append(chunk)
+                self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._changed.set()
+
+    async def replay(self) -> AsyncIterator[str]:
+        """Yield what was buffered, then follow the live stream to the end"""
+        index = 0
+        try:
+            while True:
+                if index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                    continue
+                if self.done:
+                    if self.error:
+                        raise self.error
+                    return
+                self._changed.clear()
+                await self._changed.wait()
+        finally:
+            # Reader went away early (error, cancellation): stop the request too
+            self.cancel()
+
+    def cancel(self) -> None:
+        if not self._task.done():
+            self._task.cancel()
+
+
+class SpeculativePrefetcher:
+    """
+    Args:
+        open_stream: Starts an LLM stream for a prompt (e.g. Gemini streaming)
+        stable_ms: How long a partial must stay unchanged before speculating
+        min_words: Shortest partial worth speculating on
+    """
+
+    def __init__(
+        self,
+        open_stream: Callable[[str], AsyncIterator[str]],
+        stable_ms: int = 300,
+        min_words: int = 2
+    ):
+        self.open_stream = open_stream
+        self.stable_ms = stable_ms
+        self.min_words = min_words
+        self._speculation: Optional[_Speculation] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.committed_chars = 0
+        self.wasted_chars = 0
+        self.saved_ms: deque = deque(maxlen=200)
+
+    def on_partial(self, text: str) -> None:
+        """Feed a partial transcript; speculation starts once it stops changing"""
+        key = normalize_transcript(text)
+        if self._speculation and self._speculation.key != key:
+            # The user kept talking: what we asked is no longer the question
+            self._discard()
+            self.cancelled += 1
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._speculation or len(key.split()) < self.min_words:
+            return
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self.stable_ms / 1000, self._start, text)
+
+    def _start(self, prompt: str) -> None:
+        self._timer = None
+        self.started += 1
+        self._speculation = _Speculation(prompt, self.open_stream(prompt))
+        logger.info(f"🔮 Speculative LLM request started for: {prompt[:60]}")
+
+    def commit(self, final_text: str) -> Optional[AsyncIterator[str]]:
+        """
+        Claim the speculative reply for the final transcript of the turn
+
+        Returns a stream of the reply if the speculation matches, otherwise
+        None (any speculation is cancelled and the caller starts afresh).
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        speculation = self._speculation
+        self._speculation = None
+        if speculation is None:
+            return None
+        if speculation.key != normalize_transcript(final_text) or speculation.error:
+            self.misses += 1
+            self.wasted_chars += speculation.chars
+            speculation.cancel()
+            return None
+
+        now = time.perf_counter()
+        head_start = now - speculation.started_at
+        if speculation.first_chunk_at is not None:
+            head_start = min(head_start, speculation.first_chunk_at - speculation.started_at)
+        self.saved_ms.append(head_start * 1000)
+        self.hits += 1
+        return self._track(speculation)
+
+    async def _track(self, speculation: _Speculation) -> AsyncIterator[str]:
+        async for chunk in speculation.replay():
+            self.committed_chars += len(chunk)
+            yield chunk
+
+    def _discard(self) -> None:
+        if self._speculation:
+            self.wasted_chars += self._speculation.chars
+            self._speculation.cancel()
+            self._speculation = None
+
+    def reset(self) -> None:
+        """Drop any pending speculation (session closing)"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._discard()
+
+    def stats(self) -> Dict[str, object]:
+        saved = sorted(self.saved_ms)
+        generated = self.committed_chars + self.wasted_chars
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "hit_rate": round(self.hits / self.started, 3) if self.started else 0.0,
+            "saved_ms_p50": round(saved[len(saved) // 2], 1) if saved else None,
+            "saved_ms_p90": round(saved[int(len(saved) * 0.9) - 1], 1) if len(saved) >= 10 else None,
+            "saved_ms_max": round(saved[-1], 1) if saved else None,
+            # ~4 characters per token
+            "wasted_tokens": self.wasted_chars // 4,
+            "wasted_token_ratio": round(self.wasted_chars / generated, 3) if generated else 0.0,
+        }
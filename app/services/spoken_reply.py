@@ -0,0 +1,88 @@
+"""
+Streamed spoken replies for the HTTP pipeline endpoints
+
+Instead of waiting for the full Gemini reply, one Murf clip and its download,
+the reply is streamed end to end: Gemini chunks are segmented into sentences,
+each sentence is synthesized as soon as it closes, and MP3 bytes are yielded
+to the HTTP response as they arrive. Time-to-first-byte is roughly the
+latency of the first sentence instead of the sum of every stage.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .llm import GeminiService
+from .murf_websocket import MurfStreamingService
+from .text_segmenter import TextSegmenter, segment_stream
+from .tts_pipeline import TTSPipeline
+from ..utils.fallback import get_fallback_audio_bytes
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_spoken_reply(
+    messages: List[Dict[str, str]],
+    voice_id: str,
+    murf_api_key: str,
+    gemini_api_key: Optional[str] = None,
+    max_length: int = 3000,
+    on_complete: Optional[Callable[[Optional[str]], None]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield MP3 audio for the LLM reply to ``messages`` as it is synthesized
+
+    Args:
+        messages: Conversation so far (role/content dicts)
+        voice_id: Murf voice ID
+        murf_api_key: Murf API key
+        gemini_api_key: Gemini API key (defaults to the environment)
+        max_length: Maximum reply length in characters
+        on_complete: Called with the full reply text, or None if the LLM
+            failed, once the reply has been generated
+    """
+    llm_service = GeminiService(api_key=gemini_api_key)
+    murf_service = MurfStreamingService(
+        murf_api_key, voice_id=voice_id, audio_format="MP3", mock_fallback=False
+    )
+    await murf_service.connect()
+    pipeline = TTSPipeline(murf_service.synthesize_stream)
+
+    async def produce() -> None:
+        reply = ""
+        failed = False
+
+        async def llm_chunks():
+            nonlocal reply
+            async for chunk in llm_service.generate_streaming_response(messages):
+                remaining = max_length - len(reply)
+                if remaining <= 0:
+                    break
+                chunk = chunk[:remaining]
+                reply += chunk
+                yield chunk
+
+        try:
+            async for segment in segment_stream(llm_chunks(), TextSegmenter()):
+                pipeline.submit(segment)
+        except Exception as e:
+            logger.error(f"❌ Error streaming LLM reply: {e}")
+            failed = True
+        finally:
+            pipeline.close()
+            if on_complete:
+                on_complete(None if failed or not reply.strip() else reply)
+
+    producer = asyncio.create_task(produce())
+    sent_audio = False
+    try:
+        async for chunk in pipeline.audio():
+            sent_audio = True
+            yield chunk
+        await producer
+        if not sent_audio:
+            yield get_fallback_audio_bytes()
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await pipeline.cancel()
+        await murf_service.close()
@@ -1,12 +1,17 @@
 """
 Speech-to-Text service using AssemblyAI
 """
+import asyncio
 import os
+from typing import Optional
 import assemblyai as aai
 from fastapi import UploadFile
 from fastapi.responses import JSONResponse
 
+from .http_client import get_http_client
+
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+ASSEMBLYAI_BASE_URL = "https://api.assemblyai.com/v2"
 
 # Initialize AssemblyAI settings but not the transcriber yet
 if ASSEMBLYAI_API_KEY:
@@ -25,6 +30,46 @@ def get_transcriber():
     
     return get_transcriber._transcriber
 
+async def transcribe_bytes(
+    audio_bytes: bytes,
+    api_key: Optional[str] = None,
+    poll_interval: float = 1.0,
+    timeout: float = 120.0
+) -> str:
+    """
+    Transcribe audio bytes through the AssemblyAI REST API
+
+    Uses the shared async HTTP client (upload, create transcript, poll) so the
+    event loop is never blocked while AssemblyAI processes the audio.
+    """
+    api_key = api_key or ASSEMBLYAI_API_KEY or os.getenv("ASSEMBLYAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("AssemblyAI key missing")
+
+    client = get_http_client()
+    headers = {"authorization": api_key}
+
+    upload = await client.post_json(f"{ASSEMBLYAI_BASE_URL}/upload", headers=headers, data=audio_bytes)
+    job = await client.post_json(
+        f"{ASSEMBLYAI_BASE_URL}/transcript",
+        headers=headers,
+        json={"audio_url": upload["upload_url"]},
+    )
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        response = await client.request("GET", f"{ASSEMBLYAI_BASE_URL}/transcript/{job['id']}", headers=headers)
+        response.raise_for_status()
+        result = response.json()
+        if result.get("status") == "completed":
+            return result.get("text") or ""
+        if result.get("status") == "error":
+            raise RuntimeError(f"Transcription failed: {result.get('error')}")
+        if loop.time() >= deadline:
+            raise RuntimeError("Transcription timed out")
+        await asyncio.sleep(poll_interval)
+
 async def transcribe_audio_file(file: UploadFile) -> dict:
     """
     Transcribe audio file using AssemblyAI
@@ -34,10 +79,9 @@ async def transcribe_audio_file(file: UploadFile) -> dict:
         if not ASSEMBLYAI_API_KEY:
             raise RuntimeError("AssemblyAI key missing")
             
-        transcriber = get_transcriber()
-        transcript = transcriber.transcribe(audio_bytes)
+        text = await transcribe_bytes(audio_bytes)
         return {
-            "transcription": transcript.text,
+            "transcription": text,
             "status": "🔊 Transcription complete!",
             "icon": "🔊"
         }
@@ -0,0 +1,166 @@
+"""
+Per-session audio sender for the streaming STT client
+
+The AssemblyAI streaming client's ``send_audio`` is blocking. Running it on
+the shared thread pool once per frame lets a few busy sessions starve every
+other session (and the connect/close calls queued behind them). Each session
+instead gets one sender thread that drains its own queue in order. The event
+loop only appends to the queue; when the upstream falls behind, ``send``
+waits briefly (backpressure) and then drops the oldest frames so live audio
+stays close to real time. Only independent PCM frames can be dropped:
+container bytes (WebM/Ogg passed through as-is) are useless once a fragment
+is missing, so those wait for space instead.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AudioSender:
+    """
+    Args:
+        send: Blocking function that delivers one frame upstream
+        name: Thread name (for logs)
+        max_frames: Queue limit; older frames are dropped beyond this
+        high_water: Queue depth at which ``send`` starts waiting
+        max_wait: Longest ``send`` waits for space before dropping
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], None],
+        name: str = "stt-sender",
+        max_frames: int = 100,
+        high_water: int = 40,
+        max_wait: float = 0.1
+    ):
+        self._send = send
+        self.name = name
+        self.max_frames = max_frames
+        self.high_water = min(high_water, max_frames)
+        self.max_wait = max_wait
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._space = asyncio.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._started = False
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_dropped = 0
+        self.send_errors = 0
+        self.backpressure_waits = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._recent_latency_ms: deque = deque(maxlen=200)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        if not self._started:
+            self._loop = asyncio.get_running_loop()
+            self._started = True
+            self._thread.start()
+
+    async def send(self, frame: bytes, droppable: bool = True) -> None:
+        """
+        Queue a frame for delivery, waiting briefly if the upstream is behind
+
+        With ``droppable=False`` the frame never displaces older frames:
+        ``send`` waits (without a time limit) until the queue has room.
+        """
+        if self._closing:
+            return
+        if not self._started:
+            self.start()
+
+        if not droppable:
+            while len(self._queue) >= self.max_frames and not self._closing:
+                self.backpressure_waits += 1
+                self._space.clear()
+                await self._space.wait()
+            if self._closing:
+                return
+        elif len(self._queue) >= self.high_water:
+            self.backpressure_waits += 1
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+
+        with self._cond:
+            while len(self._queue) >= self.max_frames:
+                self._queue.popleft()
+                self.frames_dropped += 1
+            self._queue.append((frame, time.perf_counter()))
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                frame, queued_at = self._queue.popleft()
+                depth = len(self._queue)
+
+            if depth < self.high_water and self._loop is not None and not self._space.is_set():
+                try:
+                    self._loop.call_soon_threadsafe(self._space.set)
+                except RuntimeError:
+                    # Event loop already closed
+                    pass
+
+            try:
+                self._send(frame)
+            except Exception as e:
+                self.send_errors += 1
+                logger.error(f"❌ {self.name}: failed to send audio frame: {e}")
+                continue
+            self._record(len(frame), (time.perf_counter() - queued_at) * 1000)
+
+    def _record(self, size: int, latency_ms: float) -> None:
+        self.frames_sent += 1
+        self.bytes_sent += size
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+        self._recent_latency_ms.append(latency_ms)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Send what is still queued, then stop the thread"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        # Release senders waiting for space
+        self._space.set()
+        if self._started:
+            await asyncio.to_thread(self._thread.join, timeout)
+            if self._thread.is_alive():
+                logger.warning(f"⚠️ {self.name}: sender did not finish within {timeout}s")
+
+    def stats(self) -> Dict[str, object]:
+        recent = sorted(self._recent_latency_ms)
+        return {
+            "queue_depth": self.depth,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_dropped": self.frames_dropped,
+            "send_errors": self.send_errors,
+            "backpressure_waits": self.backpressure_waits,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "avg_latency_ms": round(self._total_latency_ms / self.frames_sent, 3) if self.frames_sent else 0.0,
+            "p95_latency_ms": round(recent[int(len(recent) * 0.95) - 1], 3) if len(recent) >= 20 else None,
+            "max_latency_ms": round(self.max_latency_ms, 3),
+        }
@@ -0,0 +1,159 @@
+"""
+Streaming text segmenter between the LLM stream and TTS
+
+LLM chunks are arbitrary token bursts, often cut mid-word. Sending each one
+to TTS produces choppy prosody and one request per burst, so the segmenter
+buffers them into sentence/clause sized units and releases each unit as
+soon as it closes.
+"""
+import asyncio
+import re
+import logging
+from typing import AsyncIterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sentence end: terminal punctuation (optionally followed by closing quotes or
+# brackets) and then whitespace
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+')
+# Clause end: softer punctuation followed by whitespace
+CLAUSE_END = re.compile(r'[,;:—–]\s+|\s+-\s+')
+
+
+class TextSegmenter:
+    """
+    Incremental sentence/clause segmenter
+
+    Args:
+        min_chars: Segments shorter than this keep buffering
+        max_chars: Buffers longer than this are split at the last clause
+            boundary (or word boundary) that fits
+        first_min_chars: Minimum length for the first segment, which may also
+            close on a clause boundary to get audio started quickly
+        flush_timeout: Seconds without new text before ``segment_stream``
+            flushes the complete words buffered so far
+    """
+
+    def __init__(
+        self,
+        min_chars: int = 40,
+        max_chars: int = 250,
+        first_min_chars: int = 20,
+        flush_timeout: float = 0.6
+    ):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_min_chars = first_min_chars
+        self.flush_timeout = flush_timeout
+        self._buffer = ""
+        self.segment_count = 0
+
+    @property
+    def buffered(self) -> str:
+        return self._buffer
+
+    def feed(self, text: str) -> List[str]:
+        """Add LLM output and return every segment that is now complete"""
+        self._buffer += text
+        segments = []
+        while True:
+            segment = self._next_segment()
+            if segment is None:
+                break
+            segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """Return whatever is buffered as a final segment"""
+        segment = self._buffer.strip()
+        self._buffer = ""
+        if not segment:
+            return None
+        self.segment_count += 1
+        return segment
+
+    def flush_words(self) -> Optional[str]:
+        """Flush complete words, keeping a trailing partial word buffered"""
+        space = max(self._buffer.rfind(" "), self._buffer.rfind("\n"))
+        if space <= 0:
+            return None
+        segment = self._buffer[:space].strip()
+        self._buffer = self._buffer[space + 1:]
+        if not segment:
+            return None
+        self.segment_count += 1
+        return segment
+
+    def _next_segment(self) -> Optional[str]:
+        first = self.segment_count == 0
+        min_chars = self.first_min_chars if first else self.min_chars
+
+        cut = self._find_boundary(SENTENCE_END, min_chars, len(self._buffer))
+        if cut is None and first:
+            cut = self._find_boundary(CLAUSE_END, min_chars, len(self._buffer))
+        if cut is None and len(self._buffer) > self.max_chars:
+            cut = self._find_boundary(CLAUSE_END, 1, self.max_chars, last=True)
+            if cut is None:
+                space = self._buffer.rfind(" ", 0, self.max_chars)
+                cut = space + 1 if space > 0 else self.max_chars
+        if cut is None:
+            return None
+
+        segment = self._buffer[:cut].strip()
+        self._buffer = self._buffer[cut:]
+        if not segment:
+            return None
+        self.segment_count += 1
+        return segment
+
+    def _find_boundary(self, pattern: re.Pattern, min_chars: int, limit: int, last: bool = False) -> Optional[int]:
+        found = None
+        for match in pattern.finditer(self._buffer, 0, limit):
+            if match.end() < min_chars:
+                continue
+            found = match.end()
+            if not last:
+                break
+        return found
+
+
+async def segment_stream(
+    chunks: AsyncIterator[str],
+    segmenter: Optional[TextSegmenter] = None
+) -> AsyncIterator[str]:
+    """
+    Re-chunk an async stream of LLM text into TTS segments
+
+    Segments are yielded as soon as they close. If the upstream stalls for
+    longer than ``flush_timeout`` the complete words buffered so far are
+    flushed so audio does not wait on a slow model.
+    """
+    segmenter = segmenter or TextSegmenter()
+    iterator = chunks.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=segmenter.flush_timeout)
+            if not done:
+                segment = segmenter.flush_words()
+                if segment:
+                    yield segment
+                continue
+
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            for segment in segmenter.feed(chunk):
+                yield segment
+
+        segment = segmenter.flush()
+        if segment:
+            yield segment
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -1,13 +1,20 @@
 """
 Text-to-Speech service using Murf AI
 """
+import asyncio
+import logging
 import os
-import requests
+from typing import Optional, Set
 from fastapi.responses import JSONResponse, StreamingResponse
 from io import BytesIO
 from ..utils.fallback import get_fallback_audio_bytes
+from .http_client import get_http_client
+from .tts_cache import get_tts_cache
+
+logger = logging.getLogger(__name__)
 
 MURF_API_KEY = os.getenv("MURF_API_KEY")
+MURF_GENERATE_URL = "https://api.murf.ai/v1/speech/generate"
 
 VOICE_MAP = {
     "default": "en-US-natalie",
@@ -17,29 +24,91 @@ VOICE_MAP = {
     "game": "en-US-paul"
 }
 
+def resolve_voice_id(voice: str) -> str:
+    """Map a voice preset name to a Murf voice ID"""
+    return VOICE_MAP.get(voice.lower(), "en-US-natalie")
+
+def _murf_headers(api_key: Optional[str]) -> dict:
+    return {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "api-key": api_key or MURF_API_KEY or os.getenv("MURF_API_KEY") or ""
+    }
+
+# Background cache downloads in flight (the event loop only keeps weak references to tasks)
+_pending_downloads: Set[asyncio.Task] = set()
+
+async def _cache_audio_file(text: str, voice_id: str, audio_url: str) -> None:
+    """Download a generated clip into the TTS cache"""
+    audio = await get_http_client().get_bytes(audio_url, timeout=60)
+    await get_tts_cache().aput(text, voice_id, "mp3", audio)
+
+def _download_done(task: asyncio.Task) -> None:
+    _pending_downloads.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("⚠️ Could not cache generated audio: %s", task.exception())
+
+def _cache_in_background(text: str, voice_id: str, audio_url: str) -> None:
+    task = asyncio.create_task(_cache_audio_file(text, voice_id, audio_url))
+    _pending_downloads.add(task)
+    task.add_done_callback(_download_done)
+
+async def synthesize_speech_bytes(text: str, voice_id: str, api_key: Optional[str] = None) -> bytes:
+    """
+    Get MP3 audio for ``text``, from the TTS cache when possible
+
+    On a miss the clip is generated with Murf, downloaded and cached.
+    """
+    cache = get_tts_cache()
+    audio = await cache.aget(text, voice_id, "mp3")
+    if audio is not None:
+        return audio
+
+    client = get_http_client()
+    murf_data = await client.post_json(
+        MURF_GENERATE_URL,
+        headers=_murf_headers(api_key),
+        json={"text": text, "voice_id": voice_id, "format": "mp3"},
+        timeout=60,
+    )
+    audio_url = murf_data.get("audioFile")
+    if not audio_url:
+        raise RuntimeError("Murf API did not return audioFile")
+
+    audio = await client.get_bytes(audio_url, timeout=60)
+    await cache.aput(text, voice_id, "mp3", audio)
+    return audio
+
 async def generate_speech(text: str, voice: str = "default") -> StreamingResponse | JSONResponse:
     """
     Generate speech from text using Murf AI
     """
-    voice_id = VOICE_MAP.get(voice.lower(), "en-US-natalie")
+    voice_id = resolve_voice_id(voice)
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "api-key": MURF_API_KEY or ""
-    }
-    payload = {"text": text, "voice_id": voice_id}
+    # Serve repeated phrases straight from the cache
+    cache = get_tts_cache()
+    cached_path = await asyncio.to_thread(cache.file_path, text, voice_id, "mp3")
+    cached_url = cache.public_url(cached_path) if cached_path else None
+    if cached_url:
+        return JSONResponse(content={"audio_url": cached_url, "cached": True})
+
+    payload = {"text": text, "voice_id": voice_id, "format": "mp3"}
 
     try:
-        response = requests.post(
-            "https://api.murf.ai/v1/speech/generate",
-            headers=headers,
+        response = await get_http_client().request(
+            "POST",
+            MURF_GENERATE_URL,
+            headers=_murf_headers(None),
             json=payload,
             timeout=30,
         )
-        if response.status_code == 200:
+        if response.status == 200:
             result = response.json()
-            return JSONResponse(content={"audio_url": result.get("audioFile")})
+            audio_url = result.get("audioFile")
+            if audio_url:
+                # Populate the cache in the background so this reply is not delayed
+                _cache_in_background(text, voice_id, audio_url)
+            return JSONResponse(content={"audio_url": audio_url})
         else:
             # Fallback on error
             audio_bytes = get_fallback_audio_bytes()
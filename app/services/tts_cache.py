@@ -0,0 +1,232 @@
+"""
+Content-addressed cache for synthesized speech
+
+Entries are keyed on (normalized text, voice_id, format). A bounded in-memory
+LRU tier sits in front of an on-disk tier that is evicted oldest-first once
+it grows past its size limit. Disk files live under the static mount so a
+cached clip can be served by URL without another Murf round trip.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "static/audio/cache"
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different strings share a cache entry"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TTSCache:
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        memory_limit_bytes: int = 32 * 1024 * 1024,
+        disk_limit_bytes: int = 512 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.memory_limit_bytes = memory_limit_bytes
+        self.disk_limit_bytes = disk_limit_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = {"memory": 0, "disk": 0}
+        self._scan_disk()
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, fmt: str) -> str:
+        """Content hash of the request; the format doubles as file extension"""
+        fmt = fmt.lower()
+        raw = "\x00".join((normalize_text(text), voice_id, fmt))
+        return f"{hashlib.sha256(raw.encode('utf-8')).hexdigest()}.{fmt}"
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _scan_disk(self) -> None:
+        """Rebuild the disk index, oldest entries first"""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def get(self, text: str, voice_id: str, fmt: str) -> Optional[bytes]:
+        """Look up audio, promoting disk hits into memory"""
+        key = self.make_key(text, voice_id, fmt)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return audio
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._filename(key), "rb") as f:
+                    audio = f.read()
+                os.utime(self._filename(key))
+            except OSError:
+                audio = None
+            if audio is not None:
+                with self._lock:
+                    self._disk.move_to_end(key)
+                    self.hits["disk"] += 1
+                    self._memory_put(key, audio)
+                return audio
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, voice_id: str, fmt: str, audio: bytes) -> str:
+        """Store audio in both tiers and return its key"""
+        key = self.make_key(text, voice_id, fmt)
+        with self._lock:
+            self._memory_put(key, audio)
+        self._disk_put(key, audio)
+        return key
+
+    def file_path(self, text: str, voice_id: str, fmt: str) -> Optional[str]:
+        """
+        Path of the on-disk copy, written from memory if it was evicted
+
+        Counts as a hit or miss like ``get``.
+        """
+        key = self.make_key(text, voice_id, fmt)
+        with self._lock:
+            on_disk = key in self._disk
+            audio = self._memory.get(key)
+        if on_disk and os.path.exists(self._filename(key)):
+            with self._lock:
+                self._disk.move_to_end(key)
+                self.hits["disk"] += 1
+            return self._filename(key)
+        if audio is not None:
+            self._disk_put(key, audio)
+            with self._lock:
+                self.hits["memory"] += 1
+            return self._filename(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def public_url(self, path: str) -> Optional[str]:
+        """URL under the ``/static`` mount for a cached file, if it is served"""
+        relative = os.path.relpath(path).replace(os.sep, "/")
+        if relative.startswith("static/"):
+            return "/" + relative
+        return None
+
+    async def aget(self, text: str, voice_id: str, fmt: str) -> Optional[bytes]:
+        """``get`` with disk reads moved off the event loop"""
+        return await asyncio.to_thread(self.get, text, voice_id, fmt)
+
+    async def aput(self, text: str, voice_id: str, fmt: str, audio: bytes) -> str:
+        """``put`` with disk writes moved off the event loop"""
+        return await asyncio.to_thread(self.put, text, voice_id, fmt, audio)
+
+    def _memory_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_limit_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_limit_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions["memory"] += 1
+
+    def _disk_put(self, key: str, audio: bytes) -> None:
+        path = self._filename(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("❌ Error writing TTS cache entry: %s", e)
+            return
+
+        evict = []
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            while self._disk_bytes > self.disk_limit_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.evictions["disk"] += 1
+                evict.append(old_key)
+        for old_key in evict:
+            try:
+                os.remove(self._filename(old_key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = self.hits["memory"] + self.hits["disk"]
+            lookups = hits + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": dict(self.evictions),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_limit_bytes": self.memory_limit_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_limit_bytes": self.disk_limit_bytes,
+            }
+
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    """
+    Get the process-wide TTS cache
+
+    Configured with ``TTS_CACHE_DIR``, ``TTS_CACHE_MEMORY_MB`` and
+    ``TTS_CACHE_DISK_MB``.
+    """
+    global _cache
+    if _cache is None:
+        _cache = TTSCache(
+            cache_dir=os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR),
+            memory_limit_bytes=int(float(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024),
+            disk_limit_bytes=int(float(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024),
+        )
+    return _cache
@@ -0,0 +1,191 @@
+"""
+Pipelined TTS synthesis with ordered audio delivery
+
+Text segments are synthesized concurrently (bounded) on a worker pool while
+audio is delivered strictly in submission order: the head segment streams
+straight through as its chunks arrive, later segments buffer until it is
+their turn. Playback of segment N therefore overlaps synthesis of N+1 and
+end-to-end latency is bounded by the first segment rather than the sum.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Segments each pipeline synthesizes at the same time
+TTS_MAX_CONCURRENCY = max(1, int(os.getenv("TTS_MAX_CONCURRENCY", "3")))
+# Sessions expected to speak at once; the shared pool gets a full share of threads for each
+TTS_EXPECTED_SESSIONS = max(1, int(os.getenv("TTS_EXPECTED_SESSIONS", "16")))
+# The SDK calls block a thread for the whole stream, so an undersized pool lets a few
+# speaking sessions queue every other session's first audio behind them
+TTS_WORKERS = max(1, int(os.getenv("TTS_WORKERS", str(TTS_EXPECTED_SESSIONS * TTS_MAX_CONCURRENCY))))
+
+# Worker pool for blocking SDK synthesis calls, shared by every pipeline
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+_END = object()
+
+AudioHandler = Callable[[bytes], Union[None, Awaitable[None]]]
+
+
+async def iterate_in_thread(
+    factory: Callable[[], Iterable[bytes]],
+    executor: Optional[ThreadPoolExecutor] = None,
+    cancel: Optional[threading.Event] = None
+) -> AsyncIterator[bytes]:
+    """
+    Consume a blocking iterator on a worker thread and yield its items
+
+    ``factory`` is called on the worker thread so that connection setup
+    does not block the event loop either. The worker stops at the next item
+    once the consumer goes away or ``cancel`` is set.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = threading.Event()
+
+    def produce():
+        try:
+            for item in factory():
+                if finished.is_set() or (cancel is not None and cancel.is_set()):
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    loop.run_in_executor(executor or tts_executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        finished.set()
+
+
+class _Segment:
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.text = text
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+
+class TTSPipeline:
+    """
+    Ordered, bounded-concurrency TTS stage
+
+    Args:
+        synthesize: Blocking callable returning an iterator of audio chunks
+            for a text segment (e.g. the Murf SDK stream)
+        max_concurrency: Segments synthesized at the same time
+        executor: Worker pool for ``synthesize`` (defaults to ``tts_executor``)
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Iterable[bytes]],
+        max_concurrency: int = TTS_MAX_CONCURRENCY,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.synthesize = synthesize
+        self.executor = executor or tts_executor
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._segments: List[_Segment] = []
+        self._new_segment = asyncio.Event()
+        self._closed = False
+        self._cancelled = False
+        self._stop = threading.Event()
+        self._delivery_task: Optional[asyncio.Task] = None
+        self.bytes_delivered = 0
+
+    def submit(self, text: str) -> None:
+        """Queue a text segment for synthesis"""
+        if self._closed:
+            raise RuntimeError("TTS pipeline is closed")
+        if not text or not text.strip():
+            return
+        segment = _Segment(len(self._segments), text)
+        segment.task = asyncio.create_task(self._synthesize(segment))
+        self._segments.append(segment)
+        self._new_segment.set()
+
+    def close(self) -> None:
+        """Signal that no more segments will be submitted"""
+        self._closed = True
+        self._new_segment.set()
+
+    async def _synthesize(self, segment: _Segment) -> None:
+        try:
+            async with self._semaphore:
+                if self._cancelled:
+                    return
+                async for chunk in iterate_in_thread(
+                    lambda: self.synthesize(segment.text), self.executor, self._stop
+                ):
+                    segment.queue.put_nowait(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ TTS synthesis failed for segment {segment.index}: {e}")
+        finally:
+            segment.queue.put_nowait(_END)
+
+    async def audio(self) -> AsyncIterator[bytes]:
+        """Yield synthesized audio chunks in segment order"""
+        index = 0
+        while not self._cancelled:
+            if index >= len(self._segments):
+                if self._closed:
+                    break
+                self._new_segment.clear()
+                await self._new_segment.wait()
+                continue
+
+            segment = self._segments[index]
+            while True:
+                chunk = await segment.queue.get()
+                if chunk is _END or self._cancelled:
+                    break
+                self.bytes_delivered += len(chunk)
+                yield chunk
+            index += 1
+
+    def start(self, on_audio: AudioHandler) -> asyncio.Task:
+        """Deliver audio to ``on_audio`` in a background task"""
+        async def deliver():
+            async for chunk in self.audio():
+                result = on_audio(chunk)
+                if inspect.isawaitable(result):
+                    await result
+
+        self._delivery_task = asyncio.create_task(deliver())
+        return self._delivery_task
+
+    async def wait(self) -> None:
+        """Close the pipeline and wait until all audio has been delivered"""
+        self.close()
+        if self._delivery_task is not None:
+            await self._delivery_task
+
+    async def cancel(self) -> None:
+        """Abort pending synthesis and stop delivering audio"""
+        self._cancelled = True
+        self._stop.set()
+        self.close()
+        tasks = [segment.task for segment in self._segments if segment.task and not segment.task.done()]
+        if self._delivery_task is not None and not self._delivery_task.done():
+            tasks.append(self._delivery_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
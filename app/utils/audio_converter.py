@@ -1,9 +1,16 @@
 """
 Audio conversion utilities for streaming audio
 """
+import asyncio
 import io
 import logging
-from typing import Optional
+import math
+import os
+import shutil
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from .frame_aligner import FrameAligner
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +24,21 @@ except ImportError:
     PYDUB_AVAILABLE = False
     logger.warning("⚠️ pydub not available - audio conversion will be limited")
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("⚠️ numpy not available - raw PCM resampling disabled")
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+STREAMING_DECODER_AVAILABLE = FFMPEG_BINARY is not None
+if not STREAMING_DECODER_AVAILABLE:
+    logger.warning("⚠️ ffmpeg not found - WebM/Ogg streams will not be decoded to PCM")
+
+# ffmpeg demuxer for each container detect_audio_format() recognizes
+_DEMUXERS = {"webm": "matroska", "ogg": "ogg"}
+
 def convert_webm_to_pcm(audio_data: bytes, sample_rate: int = 16000) -> Optional[bytes]:
     """
     Convert WebM/Opus audio data to PCM format for AssemblyAI
@@ -80,6 +102,355 @@ def convert_audio_chunk_to_pcm(audio_chunk: bytes, sample_rate: int = 16000) ->
         logger.error(f"❌ Failed to process audio chunk: {e}")
         return None
 
+def detect_audio_format(audio_chunk: bytes) -> str:
+    """
+    Guess the stream format from the first chunk of a connection
+
+    Returns:
+        "webm", "ogg" or "pcm" (raw 16-bit PCM is assumed for anything else)
+    """
+    if audio_chunk.startswith(b'\x1a\x45\xdf\xa3'):
+        return "webm"
+    if audio_chunk.startswith(b'OggS'):
+        return "ogg"
+    return "pcm"
+
+class StreamingPCMDecoder:
+    """
+    Persistent WebM/Ogg → mono s16le decoder for one streaming session
+
+    A single ffmpeg process is kept open for the whole session and fed the
+    container fragments as they arrive, so demuxer and Opus decoder state
+    carry over between chunks (MediaRecorder fragments after the first are
+    not decodable on their own). Decoding happens in the subprocess; the
+    event loop only moves bytes through pipes. Output is cut into fixed
+    ``frame_ms`` frames and handed to ``on_frame`` in order.
+
+    Args:
+        on_frame: Coroutine called with each PCM frame
+        input_format: "webm" or "ogg"
+        sample_rate: Output sample rate
+        frame_ms: Output frame duration
+    """
+
+    def __init__(
+        self,
+        on_frame: Callable[[bytes], Awaitable[None]],
+        input_format: str = "webm",
+        sample_rate: int = 16000,
+        frame_ms: int = 50
+    ):
+        if input_format not in _DEMUXERS:
+            raise ValueError(f"Unsupported streaming input format: {input_format}")
+        self.on_frame = on_frame
+        self.input_format = input_format
+        self.sample_rate = sample_rate
+        self._aligner = FrameAligner(frame_ms=frame_ms, sample_rate=sample_rate)
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._stderr_reader: Optional[asyncio.Task] = None
+        self._unanswered_since: Optional[float] = None
+        self.failed = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.chunks_in = 0
+        self.frames_out = 0
+        self.started_at: Optional[float] = None
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._latency_samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        """Spawn the ffmpeg process and start reading decoded audio"""
+        if not STREAMING_DECODER_AVAILABLE:
+            raise RuntimeError("ffmpeg is not available")
+        self._process = await asyncio.create_subprocess_exec(
+            FFMPEG_BINARY,
+            "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-fflags", "+nobuffer", "-probesize", "4096", "-analyzeduration", "0",
+            "-f", _DEMUXERS[self.input_format], "-i", "pipe:0",
+            "-vn", "-ac", "1", "-ar", str(self.sample_rate),
+            "-f", "s16le", "-flush_packets", "1", "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self.started_at = time.perf_counter()
+        self._reader = asyncio.create_task(self._read_output())
+        self._stderr_reader = asyncio.create_task(self._read_errors())
+        logger.info(f"🎛️ Started streaming {self.input_format} decoder (pid {self._process.pid})")
+
+    async def feed(self, chunk: bytes) -> bool:
+        """
+        Pass a container fragment to the decoder
+
+        Waits while the pipe is full, which pushes back on the client
+        instead of buffering without limit. Returns False once the decoder
+        has failed.
+        """
+        if self.failed or not self.running:
+            return False
+        if self._unanswered_since is None:
+            self._unanswered_since = time.perf_counter()
+        try:
+            self._process.stdin.write(chunk)
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            logger.error(f"❌ Streaming decoder stopped accepting input: {e}")
+            self.failed = True
+            return False
+        self.chunks_in += 1
+        self.bytes_in += len(chunk)
+        return True
+
+    async def _read_output(self) -> None:
+        try:
+            while True:
+                data = await self._process.stdout.read(65536)
+                if not data:
+                    break
+                if self._unanswered_since is not None:
+                    self._record_latency(time.perf_counter() - self._unanswered_since)
+                    self._unanswered_since = None
+                for frame in self._aligner.push(data):
+                    await self._emit(frame)
+            tail = self._aligner.flush()
+            if tail:
+                await self._emit(tail)
+        except Exception as e:
+            logger.error(f"❌ Streaming decoder output failed: {e}")
+            self.failed = True
+
+    async def _read_errors(self) -> None:
+        async for line in self._process.stderr:
+            message = line.decode(errors="replace").strip()
+            if message:
+                logger.warning(f"⚠️ ffmpeg: {message}")
+
+    async def _emit(self, frame: bytes) -> None:
+        self.frames_out += 1
+        self.bytes_out += len(frame)
+        await self.on_frame(frame)
+
+    def _record_latency(self, seconds: float) -> None:
+        latency_ms = seconds * 1000
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+        self._latency_samples += 1
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Finish decoding buffered input, emit the last frames and stop ffmpeg"""
+        if self._process is None:
+            return
+        process = self._process
+        try:
+            if process.stdin and not process.stdin.is_closing():
+                process.stdin.close()
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Streaming decoder did not exit in time, killing it")
+            process.kill()
+            await process.wait()
+        except Exception as e:
+            logger.error(f"❌ Error closing streaming decoder: {e}")
+        for task in (self._reader, self._stderr_reader):
+            if task is not None:
+                await asyncio.gather(task, return_exceptions=True)
+        if process.returncode not in (0, None) and not self.failed:
+            logger.warning(f"⚠️ Streaming decoder exited with code {process.returncode}")
+
+    def stats(self) -> Dict[str, object]:
+        audio_seconds = self.bytes_out / (2 * self.sample_rate)
+        return {
+            "input_format": self.input_format,
+            "running": self.running,
+            "failed": self.failed,
+            "chunks_in": self.chunks_in,
+            "bytes_in": self.bytes_in,
+            "frames_out": self.frames_out,
+            "bytes_out": self.bytes_out,
+            "audio_seconds": round(audio_seconds, 3),
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "avg_latency_ms": round(self._total_latency_ms / self._latency_samples, 3) if self._latency_samples else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 3),
+        }
+
+# Raw PCM sample formats accepted from clients (little-endian)
+SAMPLE_FORMATS = {"s16le": "<i2", "f32le": "<f4"}
+
+def pcm_to_float32(buffer, sample_format: str = "s16le", channels: int = 1) -> "np.ndarray":
+    """
+    Read interleaved PCM from a bytes-like buffer as mono float32 in [-1, 1]
+
+    The buffer is viewed in place; the only allocation is the float32 result.
+    """
+    samples = np.frombuffer(buffer, dtype=SAMPLE_FORMATS[sample_format])
+    scale = (1.0 / 32768.0 if sample_format == "s16le" else 1.0) / channels
+    if channels > 1:
+        mono = samples.reshape(-1, channels).sum(axis=1, dtype=np.float32)
+    else:
+        mono = samples.astype(np.float32)
+    if scale != 1.0:
+        mono *= scale
+    return mono
+
+def float32_to_int16(samples: "np.ndarray") -> bytes:
+    """Scale and clip float32 samples in place and return them as s16le bytes"""
+    samples *= 32767.0
+    np.clip(samples, -32768.0, 32767.0, out=samples)
+    return samples.astype("<i2").tobytes()
+
+class PolyphaseResampler:
+    """
+    Stateful rational resampler (e.g. 48000 → 16000, 44100 → 16000)
+
+    A Kaiser-windowed sinc low-pass is split into ``up`` phases, so each
+    output sample costs one ``taps_per_phase`` dot product. Filter history
+    and the fractional read position carry over between blocks, so chunked
+    input resamples exactly like one long signal.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, taps_per_phase: int = 24, rolloff: float = 0.9):
+        divisor = math.gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        self.taps = taps_per_phase
+
+        length = taps_per_phase * self.up
+        cutoff = rolloff * 0.5 / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2.0
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0)
+        h *= self.up / h.sum()
+        # filters[p] holds phase p reversed, to dot directly with an input window
+        self._filters = np.ascontiguousarray(h.reshape(taps_per_phase, self.up).T[:, ::-1], dtype=np.float32)
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self._position = (taps_per_phase - 1) * self.up
+
+    def process(self, samples: "np.ndarray") -> "np.ndarray":
+        """Resample one block of mono float32 samples"""
+        buffer = np.concatenate((self._history, samples))
+        total = len(buffer) * self.up
+        count = max(0, -(-(total - self._position) // self.down))
+        stride = buffer.strides[0]
+        windows = np.lib.stride_tricks.as_strided(
+            buffer, shape=(len(buffer) - self.taps + 1, self.taps), strides=(stride, stride)
+        )
+        first = self._position // self.up - (self.taps - 1)
+
+        if self.up == 1:
+            # Integer decimation: every output uses the same phase, no gather needed
+            out = windows[first:first + count * self.down:self.down] @ self._filters[0]
+        else:
+            positions = self._position + self.down * np.arange(count)
+            starts = positions // self.up - (self.taps - 1)
+            out = np.einsum("ij,ij->i", windows[starts], self._filters[positions % self.up])
+
+        keep = self.taps - 1
+        self._position += self.down * count - (len(buffer) - keep) * self.up
+        self._history = buffer[len(buffer) - keep:].copy()
+        return out.astype(np.float32, copy=False)
+
+class PCMConverter:
+    """
+    Normalize one connection's raw PCM stream to 16 kHz mono s16le
+
+    Args:
+        sample_rate: Client sample rate
+        channels: Interleaved channel count (downmixed to mono)
+        sample_format: "s16le" or "f32le"
+        target_rate: Output sample rate
+        normalize_gain: Apply a slow automatic gain toward ``target_dbfs``
+        target_dbfs: Speech level the gain aims for
+        max_gain_db: Upper bound on the applied gain
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        sample_format: str = "s16le",
+        target_rate: int = 16000,
+        normalize_gain: bool = False,
+        target_dbfs: float = -20.0,
+        max_gain_db: float = 20.0
+    ):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        if not 8000 <= sample_rate <= 192000:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        if not 1 <= channels <= 8:
+            raise ValueError(f"Unsupported channel count: {channels}")
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.target_rate = target_rate
+        self.normalize_gain = normalize_gain
+        self.target_rms = 10 ** (target_dbfs / 20)
+        self.max_gain = 10 ** (max_gain_db / 20)
+        self.gain = 1.0
+        self.frame_bytes = channels * np.dtype(SAMPLE_FORMATS[sample_format]).itemsize
+        self.passthrough = (
+            sample_rate == target_rate and channels == 1
+            and sample_format == "s16le" and not normalize_gain
+        )
+        if not self.passthrough and not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for PCM conversion")
+        self.resampler = PolyphaseResampler(sample_rate, target_rate) if sample_rate != target_rate else None
+        self._remainder = b""
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def process(self, chunk) -> bytes:
+        """Convert a block of client PCM; partial frames are kept for the next call"""
+        self.bytes_in += len(chunk)
+        if self.passthrough:
+            self.bytes_out += len(chunk)
+            return bytes(chunk)
+
+        if self._remainder:
+            chunk = self._remainder + bytes(chunk)
+        usable = len(chunk) - len(chunk) % self.frame_bytes
+        self._remainder = bytes(chunk[usable:])
+        if not usable:
+            return b""
+
+        samples = pcm_to_float32(memoryview(chunk)[:usable], self.sample_format, self.channels)
+        if self.resampler:
+            samples = self.resampler.process(samples)
+        if self.normalize_gain:
+            self._apply_gain(samples)
+        pcm = float32_to_int16(samples)
+        self.bytes_out += len(pcm)
+        return pcm
+
+    def _apply_gain(self, samples: "np.ndarray") -> None:
+        if not len(samples):
+            return
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        # Only adapt on blocks that carry signal, so silence is not pumped up
+        if rms > 10 ** (-50 / 20):
+            desired = min(self.max_gain, self.target_rms / rms)
+            self.gain += 0.2 * (desired - self.gain)
+        samples *= self.gain
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "sample_format": self.sample_format,
+            "passthrough": self.passthrough,
+            "gain_db": round(20 * math.log10(self.gain), 2) if self.normalize_gain else 0.0,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
 def is_valid_audio_chunk(audio_chunk: bytes) -> bool:
     """
     Check if the audio chunk is valid and contains actual audio data
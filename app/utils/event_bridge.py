@@ -0,0 +1,109 @@
+"""
+Thread-safe bridge from SDK callback threads to the event loop
+
+Streaming SDKs invoke their callbacks on a background thread, where there is
+no running event loop, so ``asyncio.create_task`` cannot be used there. The
+bridge captures the server loop when it starts, marshals every event onto it
+with ``call_soon_threadsafe`` and hands them to a single consumer task, so a
+session's events are handled one at a time and in arrival order. Nothing is
+dropped while the bridge is open.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventBridge:
+    """
+    Args:
+        handler: Coroutine called as ``handler(kind, payload, posted_at)``;
+            ``posted_at`` is the ``time.perf_counter()`` of the callback
+        name: Name used in logs
+    """
+
+    def __init__(self, handler: Callable[[str, Any, float], Awaitable[None]], name: str = "events"):
+        self.handler = handler
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.posted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+
+    def start(self) -> None:
+        """Bind to the running loop and start the consumer task"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    def post(self, kind: str, payload: Any = None) -> bool:
+        """Queue an event from any thread; returns False if it could not be delivered"""
+        if self._closed or self._loop is None:
+            self.dropped += 1
+            return False
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, (kind, payload, time.perf_counter()))
+        except RuntimeError:
+            # Loop already closed
+            self.dropped += 1
+            return False
+        self.posted += 1
+        return True
+
+    def _enqueue(self, item) -> None:
+        self._queue.put_nowait(item)
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            kind, payload, posted_at = item
+            lag_ms = (time.perf_counter() - posted_at) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self._total_lag_ms += lag_ms
+            try:
+                await self.handler(kind, payload, posted_at)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ {self.name}: error handling {kind} event: {e}")
+            self.processed += 1
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Handle the events already queued, then stop"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is None:
+            return
+        # Scheduled behind any events still in flight from other threads
+        self._loop.call_soon(self._queue.put_nowait, _STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.name}: events still pending after {timeout}s, cancelling")
+            self._task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "posted": self.posted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.max_depth,
+            "avg_lag_ms": round(self._total_lag_ms / self.processed, 3) if self.processed else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 3),
+        }
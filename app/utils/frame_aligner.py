@@ -0,0 +1,80 @@
+"""
+Fixed-duration framing for streamed PCM
+
+Client chunk sizes are arbitrary (MediaRecorder timeslices, VAD bursts,
+decoder reads), while the STT service works best with steady ~50 ms packets.
+The aligner coalesces small pieces and splits large ones into equal frames,
+so each upstream send carries a useful amount of audio without adding more
+than one frame of latency.
+"""
+from typing import Dict, List
+
+
+class FrameAligner:
+    """
+    Args:
+        frame_ms: Frame duration
+        sample_rate: PCM sample rate
+        sample_width: Bytes per sample (mono)
+    """
+
+    def __init__(self, frame_ms: int = 50, sample_rate: int = 16000, sample_width: int = 2):
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * sample_width
+        self.bytes_per_second = sample_rate * sample_width
+        self._pending = bytearray()
+        self.chunks_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._pending)
+
+    def push(self, data) -> List[bytes]:
+        """Add a piece of audio and return every frame it completes, in order"""
+        if not data:
+            return []
+        self.chunks_in += 1
+        self.bytes_in += len(data)
+        view = memoryview(data)
+        frames = []
+
+        # Top up a partial frame left over from the previous piece
+        if self._pending:
+            needed = self.frame_bytes - len(self._pending)
+            self._pending += view[:needed]
+            view = view[needed:]
+            if len(self._pending) < self.frame_bytes:
+                return frames
+            frames.append(bytes(self._pending))
+            self._pending.clear()
+
+        # Slice whole frames straight out of the input without staging them
+        whole = len(view) - len(view) % self.frame_bytes
+        for start in range(0, whole, self.frame_bytes):
+            frames.append(bytes(view[start:start + self.frame_bytes]))
+        self._pending += view[whole:]
+
+        self.frames_out += len(frames)
+        return frames
+
+    def flush(self) -> bytes:
+        """Return the buffered partial frame (e.g. at the end of a stream)"""
+        tail = bytes(self._pending)
+        self._pending.clear()
+        if tail:
+            self.frames_out += 1
+        return tail
+
+    def stats(self) -> Dict[str, object]:
+        audio_seconds = self.bytes_in / self.bytes_per_second
+        return {
+            "frame_ms": self.frame_ms,
+            "chunks_in": self.chunks_in,
+            "frames_out": self.frames_out,
+            "buffered_bytes": self.buffered,
+            "audio_seconds": round(audio_seconds, 3),
+            "chunks_per_audio_second": round(self.chunks_in / audio_seconds, 2) if audio_seconds else 0.0,
+            "frames_per_audio_second": round(self.frames_out / audio_seconds, 2) if audio_seconds else 0.0,
+        }
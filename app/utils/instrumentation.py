@@ -0,0 +1,103 @@
+"""
+Per-session debug instrumentation for the streaming hot path
+
+Audio and text chunks arrive many times per second per session, so writing a
+log line (or a whole base64 payload) for each of them costs more CPU than the
+work being logged. Hot-path events are counted instead; a detail line is only
+formatted when DEBUG logging is enabled, and then only for one event in
+``sample_every``. Payloads can optionally be kept in a small in-memory ring
+buffer for inspection rather than printed.
+"""
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Log one hot-path event in N (only when DEBUG logging is enabled)
+DEBUG_SAMPLE_EVERY = max(1, int(os.getenv("DEBUG_SAMPLE_EVERY", "100")))
+# Keep the last N payloads per session in memory (0 disables capture)
+DEBUG_CAPTURE_SIZE = int(os.getenv("DEBUG_CAPTURE", "0"))
+# Bytes kept from each captured payload
+DEBUG_CAPTURE_BYTES = int(os.getenv("DEBUG_CAPTURE_BYTES", "64"))
+
+
+class SessionInstrumentation:
+    """
+    Args:
+        session_id: Session the counters belong to
+        sample_every: Log one event in N per event name
+        capture_size: Payloads kept in the ring buffer (0 disables capture)
+        capture_bytes: Bytes kept from each captured payload
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        sample_every: int = DEBUG_SAMPLE_EVERY,
+        capture_size: int = DEBUG_CAPTURE_SIZE,
+        capture_bytes: int = DEBUG_CAPTURE_BYTES
+    ):
+        self.session_id = session_id
+        self.sample_every = max(1, sample_every)
+        self.capture_bytes = capture_bytes
+        self.counters: Dict[str, int] = {}
+        self.byte_counters: Dict[str, int] = {}
+        self.captured: Optional[deque] = deque(maxlen=capture_size) if capture_size > 0 else None
+        self.logged = 0
+
+    def count(self, event: str, nbytes: int = 0) -> int:
+        """Count one occurrence of ``event``; returns the running count"""
+        total = self.counters.get(event, 0) + 1
+        self.counters[event] = total
+        if nbytes:
+            self.byte_counters[event] = self.byte_counters.get(event, 0) + nbytes
+        return total
+
+    def debug(self, event: str, message: Union[str, Callable[[], str]], nbytes: int = 0) -> None:
+        """
+        Count ``event`` and log a sampled DEBUG line for it
+
+        ``message`` may be a callable so the line is only formatted when it
+        is actually going to be logged.
+        """
+        total = self.count(event, nbytes)
+        if (total - 1) % self.sample_every or not logger.isEnabledFor(logging.DEBUG):
+            return
+        self.logged += 1
+        text = message() if callable(message) else message
+        logger.debug(
+            f"🔍 [{self.session_id[:8]}] {event} #{total}: {text}",
+            extra={"session_id": self.session_id, "event": event, "count": total}
+        )
+
+    def capture(self, event: str, payload: Union[bytes, str]) -> None:
+        """Keep the head of a payload in the ring buffer (no-op unless capture is enabled)"""
+        if self.captured is None:
+            return
+        self.captured.append((time.time(), event, len(payload), payload[:self.capture_bytes]))
+
+    def captures(self) -> List[Dict[str, object]]:
+        """Captured payloads, oldest first (binary heads as hex)"""
+        if self.captured is None:
+            return []
+        return [
+            {
+                "timestamp": timestamp,
+                "event": event,
+                "size": size,
+                "head": head.hex() if isinstance(head, (bytes, bytearray)) else head,
+            }
+            for timestamp, event, size, head in self.captured
+        ]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "counters": dict(self.counters),
+            "bytes": dict(self.byte_counters),
+            "sample_every": self.sample_every,
+            "logged": self.logged,
+            "captured": len(self.captured) if self.captured is not None else 0,
+        }
@@ -0,0 +1,175 @@
+"""
+Incremental recording writer for streamed audio
+
+Chunks are appended to an in-memory batch and written to the final file by a
+background task on a worker thread, either when the batch reaches
+``flush_bytes`` or every ``flush_interval`` seconds. The recording is on disk
+as it happens, so stopping only flushes the last small batch and a dropped
+connection loses at most one interval of audio.
+
+If a write fails (disk full, permissions), the writer stops: the error is
+kept in ``error`` and later chunks are dropped and counted rather than
+blocking the caller.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingWriter:
+    """
+    Args:
+        path: Destination file (created on the first flush)
+        flush_bytes: Batch size that triggers an immediate flush
+        flush_interval: Maximum seconds between flushes
+        max_pending_bytes: Memory ceiling; ``write`` waits for the disk once
+            this much audio is queued
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_bytes: int = 256 * 1024,
+        flush_interval: float = 1.0,
+        max_pending_bytes: int = 1024 * 1024
+    ):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max(max_pending_bytes, flush_bytes)
+        self._pending = bytearray()
+        self._file = None
+        self._flush_needed = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.error: Optional[BaseException] = None
+        self.chunk_count = 0
+        self.bytes_received = 0
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def bytes_pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    async def write(self, chunk: bytes) -> None:
+        """Queue a chunk; waits only if the disk has fallen far behind"""
+        if self._closed:
+            raise RuntimeError("Recording writer is closed")
+        if not chunk:
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        while len(self._pending) >= self.max_pending_bytes and not self.failed:
+            self._drained.clear()
+            self._flush_needed.set()
+            await self._drained.wait()
+
+        if self.failed:
+            self.bytes_dropped += len(chunk)
+            return
+
+        self._pending += chunk
+        self.chunk_count += 1
+        self.bytes_received += len(chunk)
+        if len(self._pending) >= self.flush_bytes:
+            self._flush_needed.set()
+
+    async def _run(self) -> None:
+        try:
+            while not self._closed:
+                try:
+                    await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_needed.clear()
+                await self._flush()
+        except Exception as e:
+            self._fail(e)
+        finally:
+            # Never leave a writer waiting for a flush that will not happen
+            self._drained.set()
+
+    def _fail(self, error: BaseException) -> None:
+        self.error = error
+        # Audio that never reached the disk is counted, not kept
+        self.bytes_dropped += len(self._pending)
+        del self._pending[:]
+        logger.error(f"❌ Recording writer failed for {self.path}, dropping further audio: {error}")
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            self._drained.set()
+            return
+        batch = bytes(self._pending)
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write_batch, batch)
+        # Only drop the batch once it is on disk (chunks queued meanwhile stay pending)
+        del self._pending[:len(batch)]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.bytes_written += len(batch)
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        self._drained.set()
+
+    def _write_batch(self, batch: bytes) -> None:
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab")
+        self._file.write(batch)
+        self._file.flush()
+
+    async def close(self) -> int:
+        """Flush what is left, close the file and return the bytes written"""
+        if self._closed:
+            return self.bytes_written
+        self._closed = True
+        self._flush_needed.set()
+        if self._task is not None:
+            await self._task
+        if not self.failed:
+            try:
+                await self._flush()
+            except Exception as e:
+                self._fail(e)
+        if self._file is not None:
+            try:
+                await asyncio.to_thread(self._file.close)
+            except OSError as e:
+                logger.error(f"❌ Error closing recording {self.path}: {e}")
+            self._file = None
+        return self.bytes_written
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "chunks": self.chunk_count,
+            "bytes_received": self.bytes_received,
+            "bytes_written": self.bytes_written,
+            "bytes_pending": self.bytes_pending,
+            "bytes_dropped": self.bytes_dropped,
+            "error": str(self.error) if self.error else None,
+            "flush_count": self.flush_count,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
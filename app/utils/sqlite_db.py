@@ -0,0 +1,44 @@
+"""
+SQLite helpers for state shared between worker processes
+
+Databases are opened in WAL mode so readers never block the single writer,
+and every write runs in a ``BEGIN IMMEDIATE`` transaction: the write lock is
+taken up front, so read-modify-write sequences (e.g. "next sequence number,
+then insert") are atomic across processes. Lock contention is absorbed by
+SQLite's busy timeout rather than surfacing as "database is locked".
+"""
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+
+def connect(path: str, busy_timeout: float = DEFAULT_BUSY_TIMEOUT) -> sqlite3.Connection:
+    """Open ``path`` in WAL mode (autocommit; use ``write_transaction`` for writes)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints; a crash can only lose the last transactions, never corrupt
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+    return conn
+
+
+@contextmanager
+def write_transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run a block as one write transaction holding the database write lock"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -0,0 +1,137 @@
+"""
+Incremental parser for Gemini streaming responses
+
+``streamGenerateContent`` answers either as Server-Sent Events (``alt=sse``)
+or as one JSON array whose elements arrive over time. Network reads can end
+anywhere, including mid-line or mid-object, so the parser keeps partial data
+between ``feed`` calls and only returns complete events.
+"""
+import json
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEventParser:
+    def __init__(self):
+        self._buffer = bytearray()
+        self._mode: Optional[str] = None
+        # SSE state
+        self._data_lines: List[bytes] = []
+        # JSON array state
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = -1
+        self.done = False
+
+    def feed(self, data: bytes) -> List[dict]:
+        """Add bytes from the network and return every event now complete"""
+        if self.done or not data:
+            return []
+        self._buffer += data
+
+        if self._mode is None:
+            stripped = bytes(self._buffer).lstrip()
+            if not stripped:
+                return []
+            self._mode = "json" if stripped[:1] in (b"[", b"{") else "sse"
+
+        if self._mode == "sse":
+            return self._parse_sse()
+        return self._parse_json_array()
+
+    def close(self) -> List[dict]:
+        """Flush whatever is left once the response body has ended"""
+        if self._mode == "sse" and not self.done:
+            if self._buffer:
+                self._buffer += b"\n"
+            events = self._parse_sse()
+            events.extend(self._dispatch_sse())
+            return events
+        return []
+
+    def _parse_sse(self) -> List[dict]:
+        events = []
+        while not self.done:
+            newline = self._buffer.find(b"\n")
+            if newline < 0:
+                break
+            line = bytes(self._buffer[:newline]).rstrip(b"\r")
+            del self._buffer[:newline + 1]
+
+            if not line:
+                events.extend(self._dispatch_sse())
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                if value.startswith(b" "):
+                    value = value[1:]
+                self._data_lines.append(value)
+            # Comments (":") and other fields (event/id/retry) are ignored
+        return events
+
+    def _dispatch_sse(self) -> List[dict]:
+        if not self._data_lines:
+            return []
+        payload = b"\n".join(self._data_lines)
+        self._data_lines = []
+        if payload.strip() == b"[DONE]":
+            self.done = True
+            return []
+        try:
+            return [json.loads(payload)]
+        except json.JSONDecodeError:
+            logger.debug("Skipping malformed stream event: %r", payload[:100])
+            return []
+
+    def _parse_json_array(self) -> List[dict]:
+        events = []
+        buf = self._buffer
+        pos = self._scan_pos
+        end = len(buf)
+
+        while pos < end:
+            byte = buf[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif byte == 0x5C:  # backslash
+                    self._escaped = True
+                elif byte == 0x22:  # quote
+                    self._in_string = False
+            elif byte == 0x22:
+                self._in_string = True
+            elif byte == 0x7B:  # {
+                if self._depth == 0:
+                    self._object_start = pos
+                self._depth += 1
+            elif byte == 0x7D:  # }
+                self._depth -= 1
+                if self._depth == 0 and self._object_start >= 0:
+                    try:
+                        events.append(json.loads(bytes(buf[self._object_start:pos + 1])))
+                    except json.JSONDecodeError:
+                        logger.debug("Skipping malformed stream object")
+                    self._object_start = -1
+            elif byte == 0x5D and self._depth == 0:  # closing ]
+                self.done = True
+            pos += 1
+
+        # Drop consumed bytes so the buffer only holds the unfinished object
+        keep_from = self._object_start if self._object_start >= 0 else pos
+        del buf[:keep_from]
+        self._scan_pos = pos - keep_from
+        if self._object_start >= 0:
+            self._object_start = 0
+        return events
+
+
+def extract_text(event: dict) -> str:
+    """Concatenate the text parts of the first candidate in a Gemini event"""
+    candidates = event.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
@@ -0,0 +1,67 @@
+"""
+Cancellable task group for one agent reply
+
+Everything produced for a reply (LLM stream, TTS synthesis, outbound audio)
+runs under the reply's group, so when the user starts talking over the agent
+the whole reply can be torn down at once and upstream quota stops being
+spent on audio nobody will hear.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, List, Set, Union
+
+logger = logging.getLogger(__name__)
+
+Cleanup = Callable[[], Union[None, Awaitable[None]]]
+
+
+class TurnTaskGroup:
+    """
+    Args:
+        turn_id: Reply number within the session (for logs and client messages)
+    """
+
+    def __init__(self, turn_id: int):
+        self.turn_id = turn_id
+        self._tasks: Set[asyncio.Task] = set()
+        self._cleanups: List[Cleanup] = []
+        self.cancelled = False
+
+    @property
+    def active(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine as part of this reply"""
+        task = asyncio.create_task(coro)
+        if self.cancelled:
+            task.cancel()
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def on_cancel(self, cleanup: Cleanup) -> None:
+        """Register a sync or async callable to run if the reply is cancelled"""
+        self._cleanups.append(cleanup)
+
+    async def cancel(self, timeout: float = 2.0) -> float:
+        """Cancel every task and run the cleanups; returns the time taken in ms"""
+        started = time.perf_counter()
+        self.cancelled = True
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        for cleanup in self._cleanups:
+            try:
+                result = cleanup()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"❌ Error cleaning up reply {self.turn_id}: {e}")
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(f"⚠️ {len(pending)} task(s) of reply {self.turn_id} still running after {timeout}s")
+        return (time.perf_counter() - started) * 1000
@@ -0,0 +1,186 @@
+"""
+Lightweight voice activity detection for 16 kHz PCM
+
+Frames are classified with vectorized energy and zero-crossing-rate features
+against an adaptive noise floor. Long stretches of silence are dropped before
+the audio is forwarded to the STT service, while a short pre-roll keeps word
+onsets intact and a trailing window of real silence is still sent so the
+service can detect the end of the turn.
+"""
+import logging
+import time
+from collections import deque
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("⚠️ numpy not available - voice activity detection disabled")
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+class VADResult:
+    __slots__ = ("audio", "events")
+
+    def __init__(self, audio: bytes, events: List[str]):
+        self.audio = audio
+        self.events = events
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing VAD over 16-bit mono PCM
+
+    Args:
+        sample_rate: Input sample rate
+        frame_ms: Analysis frame length
+        threshold_db: Absolute minimum level (dBFS) for speech
+        noise_margin_db: Level above the tracked noise floor counted as speech
+        max_zcr: Frames above this zero-crossing rate are treated as noise
+            unless they are also well above the noise floor
+        start_frames: Consecutive speech frames needed to open a segment
+        hangover_ms: Silence tolerated inside speech before it is closed
+        preroll_ms: Audio kept from before speech onset
+        trailing_ms: Silence still forwarded after speech ends (lets the
+            STT service see the pause and close the turn)
+        keepalive_ms: While silent, forward one frame this often so the
+            upstream connection stays active (0 disables)
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold_db: float = -50.0,
+        noise_margin_db: float = 10.0,
+        max_zcr: float = 0.35,
+        start_frames: int = 2,
+        hangover_ms: int = 300,
+        preroll_ms: int = 200,
+        trailing_ms: int = 1200,
+        keepalive_ms: int = 1000
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zcr = max_zcr
+        self.start_frames = start_frames
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.trailing_frames = trailing_ms // frame_ms
+        self.keepalive_frames = keepalive_ms // frame_ms if keepalive_ms else 0
+
+        self.noise_floor_db = threshold_db
+        self.in_speech = False
+        self._remainder = b""
+        self._preroll: deque = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._speech_run = 0
+        self._silence_run = 0
+        self._trailing_left = 0
+        self._since_keepalive = 0
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames = 0
+        self.speech_frames = 0
+        self.cpu_seconds = 0.0
+
+    def _features(self, frames: "np.ndarray"):
+        samples = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        level_db = 20.0 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+        return level_db, zcr
+
+    def process(self, pcm: bytes) -> VADResult:
+        """Classify a block of PCM, returning the audio to forward and any events"""
+        started = time.process_time()
+        self.bytes_in += len(pcm)
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return VADResult(b"", [])
+
+        frames = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, self.frame_samples)
+        level_db, zcr = self._features(frames)
+
+        out = bytearray()
+        events = []
+        view = memoryview(data)
+        for i in range(frames.shape[0]):
+            frame = view[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+            loud = level_db[i] > threshold
+            is_speech = loud and (zcr[i] <= self.max_zcr or level_db[i] > threshold + self.noise_margin_db)
+            self.frames += 1
+
+            if not is_speech:
+                # Track the background level on non-speech frames only
+                self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(level_db[i])
+
+            if self.in_speech:
+                out += frame
+                self.speech_frames += 1
+                if is_speech:
+                    self._silence_run = 0
+                else:
+                    self._silence_run += 1
+                    if self._silence_run >= self.hangover_frames:
+                        self.in_speech = False
+                        self._speech_run = 0
+                        self._trailing_left = max(0, self.trailing_frames - self._silence_run)
+                        events.append(SPEECH_END)
+                continue
+
+            if is_speech:
+                self._speech_run += 1
+                if self._speech_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silence_run = 0
+                    self._trailing_left = 0
+                    events.append(SPEECH_START)
+                    for buffered in self._preroll:
+                        out += buffered
+                    self._preroll.clear()
+                    out += frame
+                    self.speech_frames += 1
+                    continue
+            else:
+                self._speech_run = 0
+
+            if self._trailing_left > 0:
+                self._trailing_left -= 1
+                out += frame
+                continue
+
+            self._preroll.append(bytes(frame))
+            self._since_keepalive += 1
+            if self.keepalive_frames and self._since_keepalive >= self.keepalive_frames:
+                self._since_keepalive = 0
+                out += frame
+
+        self.bytes_out += len(out)
+        self.cpu_seconds += time.process_time() - started
+        return VADResult(bytes(out), events)
+
+    def stats(self) -> Dict[str, object]:
+        audio_seconds = self.bytes_in / (2 * self.sample_rate)
+        return {
+            "in_speech": self.in_speech,
+            "frames": self.frames,
+            "speech_frames": self.speech_frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "send_ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+            "noise_floor_db": round(self.noise_floor_db, 1),
+            "cpu_ms_per_audio_second": round(self.cpu_seconds * 1000 / audio_seconds, 3) if audio_seconds else 0.0,
+        }
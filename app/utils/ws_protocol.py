@@ -0,0 +1,62 @@
+"""
+Binary audio frames for the /ws streaming protocol
+
+By default synthesized audio is sent to clients as base64 inside JSON text
+messages. Clients that opt in with ``{"type": "protocol", "audio": "binary"}``
+instead receive each audio chunk as one binary WebSocket message: a fixed
+24-byte header followed by the raw audio bytes.
+
+Header (network byte order)::
+
+    magic     2 bytes   b"N9"
+    version   u8        1
+    type      u8        FRAME_TTS_AUDIO, ...
+    session   16 bytes  session UUID
+    sequence  u32       per-session audio frame counter, starting at 1
+"""
+import struct
+import uuid
+from typing import NamedTuple, Union
+
+PROTOCOL_VERSION = 1
+MAGIC = b"N9"
+HEADER = struct.Struct("!2sBB16sI")
+HEADER_SIZE = HEADER.size
+
+# Frame types
+FRAME_TTS_AUDIO = 1
+
+AUDIO_MODE_JSON = "json"
+AUDIO_MODE_BINARY = "binary"
+AUDIO_MODES = (AUDIO_MODE_JSON, AUDIO_MODE_BINARY)
+
+
+class AudioFrame(NamedTuple):
+    frame_type: int
+    session_id: uuid.UUID
+    sequence: int
+    payload: memoryview
+
+
+def session_bytes(session_id: Union[str, uuid.UUID]) -> bytes:
+    """16-byte form of a session ID for frame headers"""
+    if isinstance(session_id, uuid.UUID):
+        return session_id.bytes
+    return uuid.UUID(session_id).bytes
+
+
+def encode_frame(frame_type: int, session: bytes, sequence: int, payload: bytes) -> bytes:
+    """Build a binary frame; ``session`` is the 16-byte value from ``session_bytes``"""
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, frame_type, session, sequence & 0xFFFFFFFF) + payload
+
+
+def decode_frame(data: bytes) -> AudioFrame:
+    """Parse a binary frame (the payload is a view, not a copy)"""
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"Frame too short: {len(data)} bytes")
+    magic, version, frame_type, session, sequence = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an N9 audio frame")
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+    return AudioFrame(frame_type, uuid.UUID(bytes=session), sequence, memoryview(data)[HEADER_SIZE:])
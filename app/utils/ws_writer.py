@@ -0,0 +1,259 @@
+"""
+Ordered outbound writer for one WebSocket connection
+
+Every message for a client goes through a single writer task, so messages
+leave in the order they were produced no matter how many tasks produce them.
+The queue is bounded:
+
+* control messages (transcripts, status, LLM text) wait for space, which
+  slows producers down to what the client can take;
+* ``llm_chunk`` messages still waiting in the queue are merged into one
+  (audio may be interleaved), so a slow client gets fewer, larger text
+  updates;
+* audio waits briefly and is then dropped oldest-first, keeping playback
+  close to live instead of letting a stalled client build up a backlog.
+
+A client whose socket stops accepting data for ``send_timeout`` seconds is
+treated as gone.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Message types whose queued instances can be merged by concatenating "content"
+COALESCE_TYPES = ("llm_chunk",)
+
+
+class _Outbound:
+    __slots__ = ("payload", "is_audio", "queued_at", "message")
+
+    def __init__(self, payload: Union[str, bytes, None], is_audio: bool, message: Optional[dict] = None):
+        self.payload = payload
+        self.is_audio = is_audio
+        self.message = message
+        self.queued_at = time.perf_counter()
+
+
+class WebSocketWriter:
+    """
+    Args:
+        websocket: Accepted Starlette/FastAPI WebSocket
+        name: Name used in logs
+        max_queue: Control messages queued before producers wait
+        max_audio: Audio messages queued before the oldest is dropped
+        audio_wait: Longest an audio producer waits for space before dropping
+        send_timeout: A single send taking longer than this closes the writer
+    """
+
+    def __init__(
+        self,
+        websocket,
+        name: str = "ws-writer",
+        max_queue: int = 256,
+        max_audio: int = 64,
+        audio_wait: float = 0.25,
+        send_timeout: float = 10.0
+    ):
+        self.websocket = websocket
+        self.name = name
+        self.max_queue = max_queue
+        self.max_audio = max_audio
+        self.audio_wait = audio_wait
+        self.send_timeout = send_timeout
+        self._queue: deque = deque()
+        self._audio_queued = 0
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.bytes_sent = 0
+        self.coalesced = 0
+        self.audio_dropped = 0
+        self.audio_discarded = 0
+        self.producer_waits = 0
+        self.max_depth = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._recent_latency_ms: deque = deque(maxlen=200)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def audio_queued(self) -> int:
+        return self._audio_queued
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # WebSocket-compatible send API (control messages)
+
+    async def send_text(self, text: str) -> None:
+        await self._put_control(_Outbound(text, False))
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._put_control(_Outbound(data, False))
+
+    async def send_json(self, message: Any) -> None:
+        if isinstance(message, dict) and message.get("type") in COALESCE_TYPES and self._coalesce(message):
+            return
+        keep = dict(message) if isinstance(message, dict) and message.get("type") in COALESCE_TYPES else None
+        await self._put_control(_Outbound(None if keep else json.dumps(message), False, keep))
+
+    async def send_audio(self, data: Union[str, bytes]) -> None:
+        """Queue an audio message (text or binary); dropped if the client falls too far behind"""
+        if self.closed:
+            return
+        if self._audio_queued >= self.max_audio:
+            self.producer_waits += 1
+            deadline = time.perf_counter() + self.audio_wait
+            while self._audio_queued >= self.max_audio and not self.closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._space.clear()
+                try:
+                    await asyncio.wait_for(self._space.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if self._audio_queued >= self.max_audio:
+                self._drop_oldest_audio()
+        self._append(_Outbound(data, True))
+
+    def discard_audio(self) -> int:
+        """Remove all queued audio (e.g. on barge-in); returns how many messages were dropped"""
+        kept = deque(entry for entry in self._queue if not entry.is_audio)
+        dropped = len(self._queue) - len(kept)
+        self._queue = kept
+        self._audio_queued = 0
+        self.audio_discarded += dropped
+        self._space.set()
+        return dropped
+
+    async def _put_control(self, entry: _Outbound) -> None:
+        if self.closed:
+            return
+        while len(self._queue) - self._audio_queued >= self.max_queue and not self.closed:
+            self.producer_waits += 1
+            self._space.clear()
+            await self._space.wait()
+        self._append(entry)
+
+    def _append(self, entry: _Outbound) -> None:
+        if self.closed:
+            return
+        self._queue.append(entry)
+        if entry.is_audio:
+            self._audio_queued += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+
+    def _coalesce(self, message: dict) -> bool:
+        # Merge into the newest queued control message if it is the same type; only
+        # audio may sit behind it, so control messages never change order
+        for entry in reversed(self._queue):
+            if entry.is_audio:
+                continue
+            if entry.message is None or entry.message.get("type") != message.get("type"):
+                return False
+            entry.message["content"] = entry.message.get("content", "") + message.get("content", "")
+            self.coalesced += 1
+            return True
+        return False
+
+    def _drop_oldest_audio(self) -> None:
+        for index, entry in enumerate(self._queue):
+            if entry.is_audio:
+                del self._queue[index]
+                self._audio_queued -= 1
+                self.audio_dropped += 1
+                return
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                if not self._queue:
+                    if self.closed:
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                entry = self._queue.popleft()
+                if entry.is_audio:
+                    self._audio_queued -= 1
+                self._space.set()
+
+                payload = entry.payload if entry.message is None else json.dumps(entry.message)
+                if isinstance(payload, (bytes, bytearray)):
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), timeout=self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                self._record(len(payload), (time.perf_counter() - entry.queued_at) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.name}: send blocked for {self.send_timeout}s, dropping client")
+        except Exception as e:
+            logger.warning(f"⚠️ {self.name}: client stopped accepting messages: {e}")
+        finally:
+            self._shutdown()
+
+    def _record(self, size: int, latency_ms: float) -> None:
+        self.sent += 1
+        self.bytes_sent += size
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+        self._recent_latency_ms.append(latency_ms)
+
+    def _shutdown(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        self._audio_queued = 0
+        # Release any producer still waiting for space
+        self._space.set()
+
+    async def close(self, drain_timeout: float = 2.0) -> None:
+        """Send what is queued (up to ``drain_timeout``), then stop"""
+        if self._task is None:
+            self._shutdown()
+            return
+        self.closed = True
+        self._ready.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, object]:
+        recent = sorted(self._recent_latency_ms)
+        return {
+            "queue_depth": self.depth,
+            "audio_queued": self.audio_queued,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "coalesced": self.coalesced,
+            "audio_dropped": self.audio_dropped,
+            "audio_discarded": self.audio_discarded,
+            "producer_waits": self.producer_waits,
+            "closed": self.closed,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "avg_latency_ms": round(self._total_latency_ms / self.sent, 3) if self.sent else 0.0,
+            "p95_latency_ms": round(recent[int(len(recent) * 0.95) - 1], 3) if len(recent) >= 20 else None,
+            "max_latency_ms": round(self.max_latency_ms, 3),
+        }
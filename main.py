@@ -12,7 +12,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from io import BytesIO
-import requests
 import shutil
 import os
 import assemblyai as aai
@@ -29,13 +28,49 @@ from assemblyai.streaming.v3 import (
 )
 import json
 import asyncio
+import base64
 from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional
 from app.utils.fallback import get_fallback_audio_bytes, FALLBACK_MESSAGE
 from app.routers.voice import router as voice_router
-from app.utils.audio_converter import convert_audio_chunk_to_pcm
+from app.utils.audio_converter import (
+    convert_audio_chunk_to_pcm,
+    detect_audio_format,
+    StreamingPCMDecoder,
+    STREAMING_DECODER_AVAILABLE,
+    PCMConverter,
+)
+from app.utils.vad import VoiceActivityDetector, NUMPY_AVAILABLE as VAD_AVAILABLE
+from app.utils.frame_aligner import FrameAligner
+from app.utils.instrumentation import SessionInstrumentation
+from app.utils.event_bridge import EventBridge
+from app.utils.turn_tasks import TurnTaskGroup
+from app.utils.ws_writer import WebSocketWriter
+from app.utils.ws_protocol import (
+    AUDIO_MODE_BINARY,
+    AUDIO_MODE_JSON,
+    AUDIO_MODES,
+    FRAME_TTS_AUDIO,
+    HEADER_SIZE,
+    PROTOCOL_VERSION,
+    encode_frame,
+    session_bytes,
+)
+from app.utils.vad import SPEECH_START
+from app.utils.recording_writer import RecordingWriter
+from app.models.records import Message, StreamingSession
 from app.services.llm import GeminiService
+from app.services.context_window import ContextWindow
 from app.services.murf_websocket import MurfStreamingService
+from app.services.history_store import DEFAULT_PAGE_SIZE, create_history_store
+from app.services.session_state import WORKER_ID, create_session_state
+from app.services.http_client import get_http_client, close_http_client
+from app.services.stt import transcribe_bytes
+from app.services.stt_sender import AudioSender
+from app.services.speculative_llm import SpeculativePrefetcher
+from app.services.tts import resolve_voice_id, synthesize_speech_bytes
+from app.services.spoken_reply import stream_spoken_reply
+from app.services.text_segmenter import TextSegmenter, segment_stream
 
 # Load environment variables and API keys
 load_dotenv()
@@ -71,6 +106,9 @@ logger.info("✅ Loaded Murf API Key: %s", bool(MURF_API_KEY))
 logger.info("✅ Loaded AssemblyAI Key: %s", bool(ASSEMBLYAI_API_KEY))
 logger.info("✅ Loaded Gemini API Key: %s", bool(GEMINI_API_KEY))
 
+# Shared pooled HTTP client for Gemini, Murf and AssemblyAI calls
+http_client = get_http_client()
+
 # Initialize FastAPI app
 app = FastAPI(title="N9NE AI Voice Agent")
 
@@ -118,9 +156,68 @@ async def day21_streaming_audio():
 # ============================================================
 import uuid
 import time
+from collections import deque
+
+# Store for streaming audio sessions (live objects, owned by this worker)
+streaming_sessions: Dict[str, StreamingSession] = {}
+
+# Which sessions are live and where, visible to every worker (sqlite backend)
+session_state = create_session_state()
+SESSION_STATE_TTL = float(os.getenv("SESSION_STATE_TTL", str(24 * 3600)))
+
+# In-memory ceiling per session for recorded audio not yet written to disk
+AUDIO_BUFFER_MEMORY_LIMIT = int(os.getenv("AUDIO_BUFFER_MEMORY_KB", "1024")) * 1024
+
+def new_recording_writer(session_id: str) -> RecordingWriter:
+    """Open an incremental recording file for a streaming session"""
+    filename = f"streaming_audio_{session_id[:8]}_{int(time.time())}.webm"
+    return RecordingWriter(
+        os.path.join(UPLOAD_DIR, filename),
+        max_pending_bytes=AUDIO_BUFFER_MEMORY_LIMIT
+    )
+
+def new_streaming_session(session_id: str, assemblyai_streamer, murf_service, outbound=None, instrumentation=None) -> StreamingSession:
+    """Create the per-connection state for a streaming session"""
+    return StreamingSession(
+        session_id,
+        new_recording_writer(session_id),
+        assemblyai_streamer=assemblyai_streamer,
+        murf_service=murf_service,
+        outbound=outbound,
+        instrumentation=instrumentation
+    )
+
+def latency_summary(samples) -> dict:
+    """avg/p95/max (ms) over a window of recent latency samples"""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values), 3),
+        "p95_ms": round(values[max(0, int(len(values) * 0.95) - 1)], 3),
+        "max_ms": round(values[-1], 3)
+    }
+
+async def close_streaming_session(session_id: str) -> None:
+    """Drop a streaming session, flushing its recording to disk"""
+    session_data = streaming_sessions.pop(session_id, None)
+    if session_data:
+        await session_data.recorder.close()
 
-# Store for streaming audio sessions
-streaming_sessions = {}
+def publish_session_state(session_id: str, **fields) -> None:
+    """Update the shared record for a session (never fails the connection)"""
+    try:
+        session_state.update(session_id, **fields)
+    except Exception as e:
+        logger.error(f"❌ Error updating session state: {e}")
+
+def unregister_session_state(session_id: str) -> None:
+    """Remove the shared record of a closed session"""
+    try:
+        session_state.remove(session_id)
+    except Exception as e:
+        logger.error(f"❌ Error removing session state: {e}")
 
 # Store WebSocket connections
 stream_manager = None
@@ -128,6 +225,25 @@ stream_manager = None
 # Thread pool for AssemblyAI operations
 executor = ThreadPoolExecutor(max_workers=4)
 
+# Server-side voice activity detection for raw PCM input
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Start the LLM on stable partial transcripts, before end of turn is confirmed
+SPECULATIVE_LLM_ENABLED = os.getenv("SPECULATIVE_LLM", "false").lower() in ("1", "true", "yes")
+
+# Conversation context sent to Gemini: recent turns verbatim within a token budget,
+# older turns folded into a rolling summary ("llm" refines it with Gemini in the background)
+CONTEXT_SUMMARIZER = os.getenv("CONTEXT_SUMMARIZER", "extractive").lower()
+context_window = ContextWindow(
+    max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "2000")),
+    keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "8")),
+    summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400")),
+    summarizer=GeminiService(api_key=GEMINI_API_KEY).summarize if CONTEXT_SUMMARIZER == "llm" else None
+)
+
+# Acknowledge inbound audio every N chunks (0 disables acks; clients can override per connection)
+CHUNK_ACK_EVERY = max(0, int(os.getenv("CHUNK_ACK_EVERY", "0")))
+
 # AssemblyAI Real-time Transcription Setup
 class AssemblyAIStreamer:
     def __init__(self, api_key: str):
@@ -139,50 +255,91 @@ class AssemblyAIStreamer:
         self.turn_start_time: Optional[float] = None
         self.llm_service = GeminiService()
         self.murf_service: Optional[MurfStreamingService] = None
+        self.streaming_client: Optional[StreamingClient] = None
+        self.input_format: Optional[str] = None
+        self.vad: Optional[VoiceActivityDetector] = None
+        self.decoder: Optional[StreamingPCMDecoder] = None
+        self.pcm_options: Optional[dict] = None
+        self.pcm_converter: Optional[PCMConverter] = None
+        self.aligner: Optional[FrameAligner] = None
+        self.sender: Optional[AudioSender] = None
+        self.events: Optional[EventBridge] = None
+        self.turn_to_llm_ms: deque = deque(maxlen=200)
+        self.prefetcher: Optional[SpeculativePrefetcher] = None
+        self.last_turn_order: Optional[int] = None
+        self.reply: Optional[TurnTaskGroup] = None
+        self.reply_count = 0
+        self.barge_in_count = 0
+        self.barge_in_ms: deque = deque(maxlen=200)
+        self.audio_mode = AUDIO_MODE_JSON
+        self._session_key = bytes(16)
+        self.audio_sequence = 0
+        self.audio_bytes_out = 0
+        self.instrumentation: Optional[SessionInstrumentation] = None
+        # Spoken turns of this connection, sent to Gemini through the context window
+        self.conversation: List[Message] = []
+        
+    def _trace(self, event: str, message, nbytes: int = 0):
+        """Count a hot-path event (sampled DEBUG log when enabled)"""
+        if self.instrumentation:
+            self.instrumentation.debug(event, message, nbytes)
+        
+    def set_audio_mode(self, mode: str) -> str:
+        """Choose how synthesized audio is sent to this client ("json" or "binary")"""
+        if mode not in AUDIO_MODES:
+            raise ValueError(f"Unknown audio mode: {mode}")
+        self.audio_mode = mode
+        logger.info(f"🔀 Audio mode set to {mode} for session {self.session_id}")
+        return mode
         
-    async def start_transcription(self, websocket: WebSocket, session_id: str):
-        """Start real-time transcription session"""
+    def set_audio_format(self, sample_rate: int = 16000, channels: int = 1,
+                         sample_format: str = "s16le", normalize_gain: bool = False) -> PCMConverter:
+        """Declare the raw PCM format this connection sends (resampled to 16 kHz mono)"""
+        options = {
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "sample_format": sample_format,
+            "normalize_gain": normalize_gain,
+        }
+        converter = PCMConverter(**options)
+        self.pcm_options = options
+        self.pcm_converter = converter
+        self.input_format = "pcm"
+        logger.info(f"🎚️ Audio format set for session {self.session_id}: {options}")
+        return converter
+        
+    async def start_transcription(self, websocket: WebSocketWriter, session_id: str):
+        """Start real-time transcription session (``websocket`` is the connection's outbound writer)"""
+        # A second start_recording on the same socket must not leave the previous ffmpeg,
+        # sender thread or AssemblyAI stream running
+        await self._close_decoder()
+        await self._close_sender()
+        await self._close_streaming_client()
         self.websocket = websocket
         self.session_id = session_id
+        self._session_key = session_bytes(session_id)
         self.current_turn_text = ""
         self.turn_start_time = time.time()
+        self.input_format = "pcm" if self.pcm_options else None
+        self.pcm_converter = PCMConverter(**self.pcm_options) if self.pcm_options else None
+        self.aligner = FrameAligner(frame_ms=50)
+        self.last_turn_order = None
+        if self.prefetcher:
+            self.prefetcher.reset()
+        self.prefetcher = SpeculativePrefetcher(
+            lambda text: self.llm_service.generate_streaming_response(self._llm_messages(text))
+        ) if SPECULATIVE_LLM_ENABLED else None
+        self.vad = VoiceActivityDetector() if VAD_ENABLED and VAD_AVAILABLE else None
         
         try:
             # Initialize Murf WebSocket service if API key is available
             if MURF_API_KEY:
-                self.murf_service = MurfStreamingService(MURF_API_KEY)
+                # No mock audio: a closed or failed connection must not reach the client as fake clips
+                self.murf_service = MurfStreamingService(MURF_API_KEY, mock_fallback=False)
                 
-                # Set up WebSocket callback to send base64 audio to client (Day 21)
-                def websocket_audio_callback(base64_audio):
-                    if self.websocket:
-                        try:
-                            audio_data = {
-                                "type": "streaming_audio",
-                                "base64_audio": base64_audio,
-                                "session_id": self.session_id
-                            }
-                            asyncio.create_task(self.websocket.send_text(json.dumps(audio_data)))
-                            logger.info(f"📤 Sent base64 audio chunk to client: {len(base64_audio)} chars")
-                        except Exception as e:
-                            logger.error(f"❌ Error sending audio to client: {e}")
-                
-                # Set the WebSocket callback
-                self.murf_service.set_websocket_callback(websocket_audio_callback)
-                
-                # Set up audio callback to send base64 audio to frontend
-                def audio_callback(base64_audio):
-                    if self.websocket:
-                        try:
-                            audio_data = {
-                                "type": "murf_audio",
-                                "base64_audio": base64_audio,
-                                "session_id": self.session_id
-                            }
-                            asyncio.create_task(self.websocket.send_text(json.dumps(audio_data)))
-                        except Exception as e:
-                            logger.error(f"❌ Error sending audio to frontend: {e}")
-                
-                self.murf_service.set_audio_callback(audio_callback)
+                # Synthesized audio goes to the client as binary frames or base64 JSON (Day 21),
+                # awaited inside the TTS delivery task so cancelling a reply drops its audio too
+                self.murf_service.set_raw_audio_callback(self._send_tts_audio)
                 
                 murf_connected = await self.murf_service.connect()
                 if murf_connected:
@@ -213,6 +370,12 @@ class AssemblyAIStreamer:
             else:
                 logger.warning("⚠️ Murf API key not available, audio generation disabled")
             
+            # SDK callbacks run on its own thread; route them onto this loop in order
+            if self.events:
+                await self.events.close()
+            self.events = EventBridge(self._handle_event, name=f"stt-events-{session_id[:8]}")
+            self.events.start()
+            
             # Initialize AssemblyAI Universal-Streaming client
             self.streaming_client = StreamingClient(
                 StreamingClientOptions(
@@ -237,6 +400,10 @@ class AssemblyAIStreamer:
                 )
             )
             
+            # Audio frames go out on this session's own sender thread, not the shared pool
+            self.sender = AudioSender(self.streaming_client.send_audio, name=f"stt-{session_id[:8]}")
+            self.sender.start()
+            
             logger.info(f"🎤 AssemblyAI transcription started for session: {session_id}")
             await websocket.send_text("AssemblyAI transcription session started")
             return True
@@ -246,18 +413,50 @@ class AssemblyAIStreamer:
             await websocket.send_text(f"Transcription setup failed: {str(e)}")
             return False
     
-    def _on_begin(self, event: BeginEvent):
+    # SDK callbacks: invoked as handler(client, event) on the SDK's thread, so they only hand off
+    def _on_begin(self, client, event: BeginEvent):
         """Called when the Universal-Streaming session begins"""
-        logger.info(f"🔌 AssemblyAI Universal-Streaming session started: {event.id}")
+        self._post_event("begin", event)
+    
+    def _on_turn(self, client, event: TurnEvent):
+        """Called for each partial or final turn transcript"""
+        self._post_event("turn", event)
+    
+    def _on_streaming_error(self, client, error: StreamingError):
+        """Called when a Universal-Streaming error occurs"""
+        self._post_event("error", error)
+    
+    def _on_terminated(self, client, event: TerminationEvent):
+        """Called when the Universal-Streaming session is terminated"""
+        self._post_event("termination", event)
     
-    def _on_turn(self, event: TurnEvent):
+    def _post_event(self, kind: str, event):
+        if not self.events or not self.events.post(kind, event):
+            logger.warning(f"⚠️ Dropped AssemblyAI {kind} event for closed session {self.session_id}")
+    
+    async def _handle_event(self, kind: str, event, received_at: float):
+        """Process one AssemblyAI event on the event loop (events arrive in order)"""
+        if kind == "turn":
+            await self._handle_turn(event, received_at)
+        elif kind == "begin":
+            logger.info(f"🔌 AssemblyAI Universal-Streaming session started: {event.id}")
+        elif kind == "termination":
+            logger.info(f"🔌 AssemblyAI Universal-Streaming session terminated: {event.audio_duration_seconds}s processed")
+        elif kind == "error":
+            logger.error(f"❌ AssemblyAI Universal-Streaming error: {event}")
+    
+    async def _handle_turn(self, event: TurnEvent, received_at: float):
         """Handle incoming turn events from Universal-Streaming"""
         if not event.transcript:
             return
 
-        # Print transcription to terminal
         if event.end_of_turn:
-            print(f"[TRANSCRIPTION - FINAL]: {event.transcript}")
+            # With format_turns the same turn can end twice (raw, then formatted); act on the first
+            turn_order = getattr(event, "turn_order", None)
+            if turn_order is not None and turn_order == self.last_turn_order:
+                return
+            self.last_turn_order = turn_order
+            
             logger.info(f"[Transcript] {event.transcript} (end_of_turn=True)")
             
             # Accumulate text for the current turn
@@ -267,9 +466,13 @@ class AssemblyAIStreamer:
                 self.current_turn_text = event.transcript
             
             # Process the complete turn
-            asyncio.create_task(self._process_complete_turn())
+            await self._send_turn_detection(final_text=self.current_turn_text, turn_received_at=received_at)
         else:
-            print(f"[TRANSCRIPTION - PARTIAL]: {event.transcript}", end="\r")
+            self._trace("stt_partial", lambda: event.transcript)
+            # The user is talking over the reply: stop it
+            await self._barge_in("transcript")
+            if self.prefetcher:
+                self.prefetcher.on_partial(event.transcript)
     
     async def _send_transcription(self, transcript: aai.RealtimeTranscript):
         """Send transcription data to websocket client"""
@@ -287,7 +490,7 @@ class AssemblyAIStreamer:
         except Exception as e:
             logger.error(f"❌ Error in _send_transcription: {e}")
     
-    async def _send_turn_detection(self, final_text: Optional[str] = None):
+    async def _send_turn_detection(self, final_text: Optional[str] = None, turn_received_at: Optional[float] = None):
         """Send turn detection event to websocket client"""
         try:
             turn_data = {
@@ -306,7 +509,13 @@ class AssemblyAIStreamer:
             # Start LLM streaming in background once we have the final transcript
             if final_text and final_text.strip():
                 try:
-                    asyncio.create_task(self._start_llm_stream(final_text))
+                    # Reuse the speculative reply if it was asked with the same words
+                    llm_stream = self.prefetcher.commit(final_text) if self.prefetcher else None
+                    # A reply still running for the previous turn is superseded
+                    await self._barge_in("new_turn")
+                    self.reply_count += 1
+                    self.reply = TurnTaskGroup(self.reply_count)
+                    self.reply.spawn(self._start_llm_stream(final_text, turn_received_at, llm_stream))
                 except Exception as e:
                     logger.error(f"❌ Error starting LLM streaming task: {e}")
             
@@ -317,15 +526,32 @@ class AssemblyAIStreamer:
         except Exception as e:
             logger.error(f"❌ Error in _send_turn_detection: {e}")
 
-    async def _start_llm_stream(self, prompt_text: str):
-        """Start streaming LLM response for the given prompt and send to Murf WebSocket."""
+    def _llm_messages(self, prompt_text: str) -> list:
+        """Messages sent to Gemini for a spoken turn (earlier turns via the context window)"""
+        history = self.conversation + [Message("user", prompt_text)]
+        return context_window.build(f"ws:{self.session_id}", history)
+    
+    def _remember_turn(self, prompt_text: str, reply: str):
+        """Add a finished (or interrupted) turn to the conversation"""
+        self.conversation.append(Message.new("user", prompt_text))
+        if reply:
+            self.conversation.append(Message.new("assistant", reply))
+
+    async def _start_llm_stream(self, prompt_text: str, turn_received_at: Optional[float] = None,
+                                llm_stream: Optional[AsyncIterator[str]] = None):
+        """Start streaming LLM response for the given prompt and send it to Murf in sentence-sized segments."""
+        if turn_received_at is not None:
+            # End-of-turn callback (SDK thread) -> LLM request start
+            self.turn_to_llm_ms.append((time.perf_counter() - turn_received_at) * 1000)
         try:
-            messages = [{"role": "user", "content": prompt_text}]
-            print(f"[LLM STREAM START] prompt: {prompt_text}")
+            messages = self._llm_messages(prompt_text)
+            logger.debug(f"🤖 LLM stream started for: {prompt_text[:50]}" + (" (speculative)" if llm_stream else ""))
             
-            # Stream LLM response and send chunks to Murf
             full_response = ""
             chunk_count = 0
+            tts_request_count = 0
+            stream_start = time.time()
+            first_tts_latency = None
             
             # Send start of LLM response
             if self.websocket:
@@ -333,24 +559,37 @@ class AssemblyAIStreamer:
                     "type": "llm_response_start",
                     "content": ""
                 })
+
+            async def llm_chunks():
+                nonlocal full_response, chunk_count
+                source = llm_stream or self.llm_service.generate_streaming_response(messages)
+                async for chunk in source:
+                    if not chunk.strip():
+                        continue
+                    chunk_count += 1
+                    full_response += chunk
+                    
+                    # Send chunk to client
+                    if self.websocket:
+                        await self.websocket.send_json({
+                            "type": "llm_chunk",
+                            "content": chunk
+                        })
+                    yield chunk
+            
+            # Synthesize segments concurrently; audio is still delivered in order
+            tts_pipeline = None
+            if self.murf_service and self.murf_service.is_connected:
+                tts_pipeline = self.murf_service.create_pipeline()
             
-            # Stream LLM response
+            # Stream LLM response, re-chunked into sentences/clauses for TTS
             try:
-                async for chunk in self.llm_service.generate_streaming_response(messages):
-                    if chunk.strip():
-                        chunk_count += 1
-                        full_response += chunk
-                        
-                        # Send chunk to client
-                        if self.websocket:
-                            await self.websocket.send_json({
-                                "type": "llm_chunk",
-                                "content": chunk
-                            })
-                        
-                        # If we have Murf service, stream the TTS as well
-                        if self.murf_service and self.murf_service.is_connected:
-                            await self.murf_service.send_text_chunk(chunk, is_final=False)
+                async for segment in segment_stream(llm_chunks(), TextSegmenter()):
+                    if tts_pipeline:
+                        if first_tts_latency is None:
+                            first_tts_latency = time.time() - stream_start
+                        tts_request_count += 1
+                        tts_pipeline.submit(segment)
                 
                 # Finalize the response
                 if self.websocket:
@@ -359,14 +598,29 @@ class AssemblyAIStreamer:
                         "content": ""
                     })
                 
-                # Finalize TTS
-                if self.murf_service and self.murf_service.is_connected:
-                    await self.murf_service.send_text_chunk("", is_final=True)
+                # Finalize TTS once every queued segment has been delivered
+                if tts_pipeline:
+                    await tts_pipeline.wait()
                     
-                print(f"[LLM STREAM END] Total response: {len(full_response)} characters, {chunk_count} chunks")
+                self._remember_turn(prompt_text, full_response)
+                logger.info(
+                    f"🗣️ LLM reply: {len(full_response)} characters, "
+                    f"{chunk_count} LLM chunks -> {tts_request_count} TTS requests"
+                    + (f", first segment after {first_tts_latency * 1000:.0f} ms" if first_tts_latency is not None else "")
+                )
                         
+            except asyncio.CancelledError:
+                # Barge-in: stop synthesis and any audio not yet sent
+                if tts_pipeline:
+                    await tts_pipeline.cancel()
+                # Keep what was said before the interruption
+                self._remember_turn(prompt_text, full_response)
+                logger.info(f"🛑 LLM stream cancelled after {len(full_response)} characters")
+                raise
             except Exception as e:
                 logger.error(f"Error in LLM streaming: {e}")
+                if tts_pipeline:
+                    await tts_pipeline.cancel()
                 if self.websocket:
                     await self.websocket.send_json({
                         "type": "error",
@@ -392,22 +646,6 @@ class AssemblyAIStreamer:
         except Exception as e:
             logger.error(f"Error handling transcript: {e}")
     
-    async def _delayed_turn_detection(self):
-        """Send turn detection after a delay to simulate turn end"""
-        try:
-            await asyncio.sleep(2.0)  # Wait 2 seconds after final transcript
-            await self._send_turn_detection(final_text=self.current_turn_text)
-        except Exception as e:
-            logger.error(f"❌ Error in delayed turn detection: {e}")
-    
-    def _on_streaming_error(self, error: StreamingError):
-        """Called when a Universal-Streaming error occurs"""
-        logger.error(f"❌ AssemblyAI Universal-Streaming error: {error}")
-    
-    def _on_terminated(self, event: TerminationEvent):
-        """Called when the Universal-Streaming session is terminated"""
-        logger.info(f"🔌 AssemblyAI Universal-Streaming session terminated: {event.audio_duration_seconds}s processed")
-    
     async def send_audio_data(self, audio_data: bytes):
         """Send audio data to AssemblyAI for transcription"""
         if self.streaming_client:
@@ -417,34 +655,188 @@ class AssemblyAIStreamer:
                     logger.warning("⚠️ Empty audio chunk received, skipping")
                     return
                 
-                # Send audio data directly to AssemblyAI
-                await asyncio.get_event_loop().run_in_executor(
-                    executor, self.streaming_client.send_audio, audio_data
-                )
-                logger.info(f"✅ Successfully sent {len(audio_data)} bytes to AssemblyAI")
+                if self.input_format is None:
+                    self.input_format = detect_audio_format(audio_data)
+                    if self.input_format != "pcm" and STREAMING_DECODER_AVAILABLE:
+                        # Browser WebM/Ogg: decode to 16 kHz PCM across the whole session
+                        decoder = StreamingPCMDecoder(self._send_pcm, input_format=self.input_format)
+                        await decoder.start()
+                        self.decoder = decoder
+                
+                if self.decoder:
+                    if await self.decoder.feed(audio_data):
+                        return
+                    logger.warning("⚠️ Streaming decoder failed, forwarding container audio as-is")
+                    self.decoder = None
+                    self.input_format = "passthrough"
+                
+                if self.input_format == "pcm":
+                    if self.pcm_converter:
+                        # Client-declared rate/channels/sample format -> 16 kHz mono s16le
+                        audio_data = self.pcm_converter.process(audio_data)
+                        if not audio_data:
+                            return
+                    await self._send_pcm(audio_data)
+                else:
+                    # Container passthrough: every fragment is needed to decode the rest
+                    await self._send_to_assemblyai(audio_data, droppable=False)
                     
             except Exception as e:
-                logger.error(f"❌ Error streaming audio to AssemblyAI: {e}")
-                # Send error back to websocket
-                if self.websocket:
-                    try:
-                        error_data = {
-                            "type": "error",
-                            "message": f"Transcription error: {str(e)}"
-                        }
-                        await self.websocket.send_text(json.dumps(error_data))
-                    except:
-                        pass
+                await self._report_audio_error(e)
     
-    async def close(self):
-        """Close the transcription session"""
-        if hasattr(self, 'streaming_client'):
+    async def _send_pcm(self, pcm: bytes):
+        """Apply local VAD to 16 kHz PCM and forward what is left to AssemblyAI in 50 ms frames"""
+        try:
+            # Drop silence locally (keeps pre-roll and trailing silence)
+            if self.vad:
+                result = self.vad.process(pcm)
+                for event in result.events:
+                    await self._send_vad_event(event)
+                    if event == SPEECH_START:
+                        await self._barge_in("speech_start")
+                pcm = result.audio
+                if not pcm:
+                    return
+            # One upstream send per 50 ms frame, whatever size the client chunks are
+            for frame in self.aligner.push(pcm):
+                await self._send_to_assemblyai(frame)
+        except Exception as e:
+            await self._report_audio_error(e)
+    
+    async def _send_to_assemblyai(self, audio_data: bytes, droppable: bool = True):
+        # Queue for this session's sender thread (ordered; PCM frames drop-oldest when overloaded)
+        if self.sender:
+            await self.sender.send(audio_data, droppable=droppable)
+    
+    async def _report_audio_error(self, e: Exception):
+        logger.error(f"❌ Error streaming audio to AssemblyAI: {e}")
+        # Send error back to websocket
+        if self.websocket:
+            try:
+                error_data = {
+                    "type": "error",
+                    "message": f"Transcription error: {str(e)}"
+                }
+                await self.websocket.send_text(json.dumps(error_data))
+            except:
+                pass
+    
+    async def _barge_in(self, reason: str):
+        """Cancel the reply in progress (LLM, TTS, queued audio) and tell the client to stop playback"""
+        reply = self.reply
+        if not reply or not reply.active:
+            return
+        self.reply = None
+        elapsed_ms = await reply.cancel()
+        self.barge_in_count += 1
+        self.barge_in_ms.append(elapsed_ms)
+        logger.info(f"✋ Barge-in ({reason}) cancelled reply {reply.turn_id} in {elapsed_ms:.1f} ms - Session: {self.session_id}")
+        if self.websocket:
+            # Audio of the cancelled reply still waiting in the outbound queue
+            self.websocket.discard_audio()
+            try:
+                await self.websocket.send_text(json.dumps({
+                    "type": "playback_flush",
+                    "reason": reason,
+                    "turn_id": reply.turn_id,
+                    "session_id": self.session_id
+                }))
+            except Exception as e:
+                logger.error(f"❌ Error sending playback flush: {e}")
+    
+    async def _send_tts_audio(self, audio_chunk: bytes):
+        """Send one synthesized audio chunk to the client in the negotiated format"""
+        if not self.websocket:
+            return
+        try:
+            if self.audio_mode == AUDIO_MODE_BINARY:
+                # One binary message: 24-byte header + raw audio
+                self.audio_sequence += 1
+                frame = encode_frame(FRAME_TTS_AUDIO, self._session_key, self.audio_sequence, audio_chunk)
+                await self.websocket.send_audio(frame)
+                self.audio_bytes_out += len(frame)
+                self._trace("tts_audio_out", lambda: f"frame {self.audio_sequence}, {len(frame)} bytes", len(frame))
+                if self.instrumentation:
+                    self.instrumentation.capture("tts_audio_out", audio_chunk)
+                return
+            
+            # Legacy clients listen for either message type, so both are still sent
+            base64_audio = base64.b64encode(audio_chunk).decode()
+            for message_type in ("streaming_audio", "murf_audio"):
+                message = json.dumps({
+                    "type": message_type,
+                    "base64_audio": base64_audio,
+                    "session_id": self.session_id
+                })
+                await self.websocket.send_audio(message)
+                self.audio_bytes_out += len(message)
+            self._trace("tts_audio_out", lambda: f"{len(base64_audio)} base64 chars", len(audio_chunk))
+            if self.instrumentation:
+                self.instrumentation.capture("tts_audio_out", audio_chunk)
+        except Exception as e:
+            logger.error(f"❌ Error sending audio to client: {e}")
+    
+    async def cancel_reply(self):
+        """Stop any reply still being produced (client went away)"""
+        if self.reply:
+            await self.reply.cancel()
+            self.reply = None
+    
+    async def _send_vad_event(self, event: str):
+        """Send a local speech start/end hint to the websocket client"""
+        if not self.websocket:
+            return
+        try:
+            await self.websocket.send_text(json.dumps({
+                "type": "vad",
+                "event": event,
+                "session_id": self.session_id,
+                "timestamp": time.time()
+            }))
+        except Exception as e:
+            logger.error(f"❌ Error sending VAD event: {e}")
+    
+    async def _close_decoder(self):
+        """Stop the ffmpeg decoder; its last frames still go to the current sender"""
+        if self.decoder:
+            await self.decoder.close()
+            self.decoder = None
+    
+    async def _close_sender(self):
+        """Send the aligner's tail and queued frames, then stop and join the sender thread"""
+        if self.sender:
+            tail = self.aligner.flush() if self.aligner else b""
+            if tail:
+                await self.sender.send(tail)
+            await self.sender.close()
+            logger.info(f"📤 STT sender closed for session {self.session_id}: {self.sender.stats()}")
+            self.sender = None
+    
+    async def _close_streaming_client(self):
+        if self.streaming_client:
             try:
                 await asyncio.get_event_loop().run_in_executor(
                     executor, self.streaming_client.close
                 )
             except Exception as e:
                 logger.error(f"❌ Error closing AssemblyAI streaming client: {e}")
+            self.streaming_client = None
+    
+    async def close(self):
+        """Close the transcription session"""
+        # Flush the decoder first so the tail of the audio still reaches AssemblyAI
+        await self._close_decoder()
+        await self._close_sender()
+        await self._close_streaming_client()
+        
+        # The final turn arrives while the client closes; handle it before stopping the bridge
+        if self.events:
+            await self.events.close()
+        if self.prefetcher:
+            self.prefetcher.reset()
+        # Stop the reply still being produced (including one the final turn just started)
+        # before Murf goes away, so no segment is synthesized on a closed connection
+        await self.cancel_reply()
         
         # Close Murf WebSocket connection
         if self.murf_service:
@@ -463,11 +855,20 @@ async def websocket_endpoint(websocket: WebSocket):
     session_id = str(uuid.uuid4())
     logger.info(f"🔌 WebSocket connection established - Session: {session_id}")
     
+    # Every message to this client goes through one ordered, bounded writer task
+    outbound = WebSocketWriter(websocket, name=f"ws-out-{session_id[:8]}")
+    outbound.start()
+    
+    # Hot-path events are counted (and sampled at DEBUG) rather than logged per chunk
+    instrumentation = SessionInstrumentation(session_id)
+    ack_every = CHUNK_ACK_EVERY
+    
     # Initialize AssemblyAI streamer
     assemblyai_streamer = None
     if ASSEMBLYAI_API_KEY:
         logger.info(f"✅ AssemblyAI API key available, initializing streamer")
         assemblyai_streamer = AssemblyAIStreamer(ASSEMBLYAI_API_KEY)
+        assemblyai_streamer.instrumentation = instrumentation
     else:
         logger.error(f"❌ AssemblyAI API key missing!")
     
@@ -485,8 +886,8 @@ async def websocket_endpoint(websocket: WebSocket):
                     "base64_audio": base64_audio,
                     "session_id": session_id
                 }
-                await websocket.send_text(json.dumps(audio_data))
-                logger.debug(f"✅ Sent audio chunk to client - {len(base64_audio)} chars")
+                await outbound.send_audio(json.dumps(audio_data))
+                instrumentation.debug("murf_audio_out", lambda: f"{len(base64_audio)} base64 chars", len(base64_audio))
             except Exception as e:
                 logger.error(f"❌ Error sending audio to frontend: {e}")
         
@@ -496,20 +897,18 @@ async def websocket_endpoint(websocket: WebSocket):
         murf_connected = await murf_service.connect()
         if murf_connected:
             logger.info(f"✅ Murf WebSocket connected for session: {session_id}")
-            await websocket.send_text(json.dumps({
+            await outbound.send_text(json.dumps({
                 "type": "murf_status",
                 "status": "connected",
                 "message": "Murf WebSocket connected successfully"
             }))
     
     # Initialize session data
-    streaming_sessions[session_id] = {
-        "audio_chunks": [],
-        "start_time": time.time(),
-        "chunk_count": 0,
-        "assemblyai_streamer": assemblyai_streamer,
-        "murf_service": murf_service
-    }
+    streaming_sessions[session_id] = new_streaming_session(session_id, assemblyai_streamer, murf_service, outbound, instrumentation)
+    try:
+        session_state.register(session_id, recording=False, chunk_count=0)
+    except Exception as e:
+        logger.error(f"❌ Error registering session state: {e}")
     
     try:
         while True:
@@ -519,45 +918,102 @@ async def websocket_endpoint(websocket: WebSocket):
             if "bytes" in message:
                 # Handle binary audio data
                 audio_chunk = message["bytes"]
-                logger.info(f"📨 Received audio chunk: {len(audio_chunk)} bytes - Session: {session_id}")
+                session_data = streaming_sessions[session_id]
+                instrumentation.debug("audio_in", lambda: f"{len(audio_chunk)} bytes", len(audio_chunk))
+                instrumentation.capture("audio_in", audio_chunk)
                 
-                # Store the audio chunk
-                streaming_sessions[session_id]["audio_chunks"].append(audio_chunk)
-                streaming_sessions[session_id]["chunk_count"] += 1
+                # Record the audio chunk (written to disk incrementally, off the event loop)
+                await session_data.recorder.write(audio_chunk)
+                session_data.chunk_count += 1
+                session_data.ack_bytes += len(audio_chunk)
                 
                 # Send audio to AssemblyAI for real-time transcription
-                if assemblyai_streamer and assemblyai_streamer.transcriber:
+                if assemblyai_streamer and assemblyai_streamer.streaming_client:
                     try:
                         # Send audio chunk to AssemblyAI
                         await assemblyai_streamer.send_audio_data(audio_chunk)
-                        logger.info(f"🎤 Sent {len(audio_chunk)} bytes to AssemblyAI")
                     except Exception as e:
                         logger.error(f"❌ Error sending audio to AssemblyAI: {e}")
-                        await websocket.send_text(f"Transcription error: {str(e)}")
+                        await outbound.send_text(f"Transcription error: {str(e)}")
                 else:
-                    logger.warning(f"⚠️ AssemblyAI streamer not available for session: {session_id}")
+                    # Audio after stop_recording (or without AssemblyAI) is recorded but not transcribed;
+                    # counted rather than logged per chunk
+                    instrumentation.debug("audio_not_transcribed", "no active AssemblyAI stream", len(audio_chunk))
                 
-                # Send acknowledgment back to client
-                await websocket.send_text(f"Chunk {streaming_sessions[session_id]['chunk_count']} received ({len(audio_chunk)} bytes)")
+                # Acknowledge every ``ack_every`` chunks (bytes received since the last ack)
+                if ack_every and session_data.chunk_count % ack_every == 0:
+                    await outbound.send_text(f"Chunk {session_data.chunk_count} received ({session_data.ack_bytes} bytes)")
+                    session_data.ack_bytes = 0
                 
             elif "text" in message:
                 # Handle text messages (could be commands or JSON)
                 try:
                     data = json.loads(message["text"])
                     
+                    # Handle protocol message (clients opt in to binary audio frames)
+                    if data.get("type") == "protocol":
+                        mode = data.get("audio", AUDIO_MODE_JSON)
+                        if mode not in AUDIO_MODES or not assemblyai_streamer:
+                            await outbound.send_text(json.dumps({
+                                "type": "error",
+                                "message": f"Unsupported audio mode: {mode}"
+                            }))
+                            continue
+                        assemblyai_streamer.set_audio_mode(mode)
+                        try:
+                            ack_every = max(0, int(data.get("acks", ack_every)))
+                        except (TypeError, ValueError):
+                            pass
+                        await outbound.send_text(json.dumps({
+                            "type": "protocol",
+                            "audio": mode,
+                            "acks": ack_every,
+                            "version": PROTOCOL_VERSION,
+                            "header_bytes": HEADER_SIZE,
+                            "session_id": session_id
+                        }))
+                        continue
+                    
+                    # Handle audio_format message (raw PCM clients declare their format)
+                    if data.get("type") == "audio_format":
+                        if not assemblyai_streamer:
+                            await outbound.send_text(json.dumps({
+                                "type": "error",
+                                "message": "Transcription not configured"
+                            }))
+                            continue
+                        try:
+                            converter = assemblyai_streamer.set_audio_format(
+                                sample_rate=int(data.get("sample_rate", 16000)),
+                                channels=int(data.get("channels", 1)),
+                                sample_format=data.get("sample_format", "s16le"),
+                                normalize_gain=bool(data.get("normalize_gain", False))
+                            )
+                            await outbound.send_text(json.dumps({
+                                "type": "audio_format",
+                                "status": "accepted",
+                                **converter.stats()
+                            }))
+                        except (TypeError, ValueError, RuntimeError) as e:
+                            await outbound.send_text(json.dumps({
+                                "type": "error",
+                                "message": f"Unsupported audio format: {str(e)}"
+                            }))
+                        continue
+                    
                     # Handle generate_tts message
                     if data.get("type") == "generate_tts" and "text" in data:
                         logger.info(f"🎙️  TTS request received: {data['text'][:50]}...")
                         if murf_service and murf_service.connected:
                             await murf_service.send_tts(data["text"])
-                            await websocket.send_text(json.dumps({
+                            await outbound.send_text(json.dumps({
                                 "type": "tts_status",
                                 "status": "sending",
                                 "message": f"Generating TTS for: {data['text'][:50]}..."
                             }))
                         else:
                             logger.error("❌ Murf service not available or not connected")
-                            await websocket.send_text(json.dumps({
+                            await outbound.send_text(json.dumps({
                                 "type": "error",
                                 "message": "TTS service not available"
                             }))
@@ -573,17 +1029,14 @@ async def websocket_endpoint(websocket: WebSocket):
                             await assemblyai_streamer.close()
                         
                         # Save the complete audio file
-                        await save_streaming_audio(session_id, websocket)
+                        await save_streaming_audio(session_id, outbound)
+                        publish_session_state(session_id, recording=False)
                     
                     elif command == "start_recording":
                         # Reset session for new recording
-                        streaming_sessions[session_id] = {
-                            "audio_chunks": [],
-                            "start_time": time.time(),
-                            "chunk_count": 0,
-                            "assemblyai_streamer": assemblyai_streamer,
-                            "murf_service": murf_service
-                        }
+                        await close_streaming_session(session_id)
+                        streaming_sessions[session_id] = new_streaming_session(session_id, assemblyai_streamer, murf_service, outbound, instrumentation)
+                        publish_session_state(session_id, recording=True, chunk_count=0)
                 except json.JSONDecodeError:
                     # Not a JSON message, treat as plain text command
                     command = message["text"]
@@ -595,111 +1048,177 @@ async def websocket_endpoint(websocket: WebSocket):
                             await assemblyai_streamer.close()
                         
                         # Save the complete audio file
-                        await save_streaming_audio(session_id, websocket)
+                        await save_streaming_audio(session_id, outbound)
+                        publish_session_state(session_id, recording=False)
                     
                     elif command == "start_recording":
                         # Reset session for new recording
-                        streaming_sessions[session_id] = {
-                            "audio_chunks": [],
-                            "start_time": time.time(),
-                            "chunk_count": 0,
-                            "assemblyai_streamer": assemblyai_streamer,
-                            "murf_service": murf_service
-                        }
+                        await close_streaming_session(session_id)
+                        streaming_sessions[session_id] = new_streaming_session(session_id, assemblyai_streamer, murf_service, outbound, instrumentation)
+                        publish_session_state(session_id, recording=True, chunk_count=0)
                     
                     # Start AssemblyAI transcription
                     if assemblyai_streamer:
                         logger.info(f"🎤 Starting AssemblyAI transcription for session: {session_id}")
-                        transcription_started = await assemblyai_streamer.start_transcription(websocket, session_id)
+                        transcription_started = await assemblyai_streamer.start_transcription(outbound, session_id)
                         if transcription_started:
-                            await websocket.send_text("Recording started - ready to receive audio chunks with real-time transcription")
+                            await outbound.send_text("Recording started - ready to receive audio chunks with real-time transcription")
                             logger.info(f"✅ Transcription started successfully for session: {session_id}")
                         else:
-                            await websocket.send_text("Recording started - transcription unavailable")
+                            await outbound.send_text("Recording started - transcription unavailable")
                             logger.error(f"❌ Failed to start transcription for session: {session_id}")
                     else:
-                        await websocket.send_text("Recording started - AssemblyAI not configured")
+                        await outbound.send_text("Recording started - AssemblyAI not configured")
                         logger.error(f"❌ AssemblyAI not configured for session: {session_id}")
                         
                 else:
                     # Echo other text messages
                     response = f"Server echo: {command}"
-                    await websocket.send_text(response)
+                    await outbound.send_text(response)
                     logger.info(f"📤 Sent echo response: {response}")
             
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket connection closed - Session: {session_id}")
         # Clean up AssemblyAI session
         if assemblyai_streamer:
+            await assemblyai_streamer.cancel_reply()
             await assemblyai_streamer.close()
         # Clean up session data
-        if session_id in streaming_sessions:
-            del streaming_sessions[session_id]
+        await close_streaming_session(session_id)
+        unregister_session_state(session_id)
+        context_window.forget(f"ws:{session_id}")
+        await outbound.close(drain_timeout=0)
     except Exception as e:
         logger.error(f"❌ WebSocket error: {e} - Session: {session_id}")
         # Clean up AssemblyAI session
         if assemblyai_streamer:
+            await assemblyai_streamer.cancel_reply()
             await assemblyai_streamer.close()
+        await outbound.close(drain_timeout=0.5)
         try:
             await websocket.close()
         except:
             pass
         # Clean up session data
-        if session_id in streaming_sessions:
-            del streaming_sessions[session_id]
+        await close_streaming_session(session_id)
+        unregister_session_state(session_id)
+        context_window.forget(f"ws:{session_id}")
 
-async def save_streaming_audio(session_id: str, websocket: WebSocket):
+async def save_streaming_audio(session_id: str, websocket: WebSocketWriter):
     """
-    Save the streamed audio chunks to a file.
+    Finish the recording file for a session.
+
+    Audio is already on disk (see RecordingWriter), so this only flushes the
+    last batch and starts a new recording file for the next take.
     """
     if session_id not in streaming_sessions:
         await websocket.send_text("Error: Session not found")
         return
     
     session_data = streaming_sessions[session_id]
-    audio_chunks = session_data["audio_chunks"]
+    recorder = session_data.recorder
+    chunk_count = recorder.chunk_count
     
-    if not audio_chunks:
+    if not recorder.bytes_received:
         await websocket.send_text("Error: No audio data to save")
         return
     
     try:
-        # Create filename with timestamp
-        timestamp = int(time.time())
-        filename = f"streaming_audio_{session_id[:8]}_{timestamp}.webm"
-        filepath = os.path.join(UPLOAD_DIR, filename)
+        filepath = recorder.path
+        filename = os.path.basename(filepath)
         
-        # Combine all audio chunks into a single file
-        with open(filepath, "wb") as f:
-            for chunk in audio_chunks:
-                f.write(chunk)
+        # Flush the final batch and close the file
+        file_size = await recorder.close()
+        duration = time.time() - session_data.start_time
         
-        # Get file stats
-        file_size = os.path.getsize(filepath)
-        duration = time.time() - session_data["start_time"]
-        
-        logger.info(f"💾 Saved streaming audio: {filepath} ({file_size} bytes, {len(audio_chunks)} chunks, {duration:.2f}s)")
+        if recorder.failed:
+            logger.error(f"❌ Streaming audio incomplete: {filepath} ({file_size} bytes written, {recorder.bytes_dropped} dropped)")
+        else:
+            logger.info(f"💾 Saved streaming audio: {filepath} ({file_size} bytes, {chunk_count} chunks, {duration:.2f}s)")
         
-        # Send success response to client
+        # Send the result to the client (a failed disk write keeps what was written before it)
         response = {
-            "status": "success",
-            "message": "Audio saved successfully",
+            "status": "error" if recorder.failed else "success",
+            "message": f"Audio incomplete: {recorder.error}" if recorder.failed else "Audio saved successfully",
             "filename": filename,
             "file_size": file_size,
-            "chunk_count": len(audio_chunks),
+            "chunk_count": chunk_count,
             "duration": round(duration, 2)
         }
+        if recorder.failed:
+            response["bytes_dropped"] = recorder.bytes_dropped
         
         await websocket.send_text(json.dumps(response))
         
-        # Clear the session data
-        streaming_sessions[session_id]["audio_chunks"] = []
-        streaming_sessions[session_id]["chunk_count"] = 0
+        # Start a fresh recording for the session
+        session_data.recorder = new_recording_writer(session_id)
+        session_data.chunk_count = 0
+        publish_session_state(session_id, chunk_count=chunk_count, last_recording=filename)
         
     except Exception as e:
         logger.error(f"❌ Error saving streaming audio: {e}")
         await websocket.send_text(f"Error saving audio: {str(e)}")
 
+@app.get("/ws/sessions")
+async def list_streaming_sessions():
+    """Live /ws sessions across all workers"""
+    sessions = session_state.list()
+    return {
+        "sessions": sessions,
+        "total_sessions": len(sessions),
+        "worker": WORKER_ID,
+        "backend": session_state.backend_name
+    }
+
+@app.get("/ws/sessions/{session_id}/stats")
+async def streaming_session_stats(session_id: str):
+    """Per-session streaming stats (recording, input decoding, VAD)"""
+    session_data = streaming_sessions.get(session_id)
+    if session_data is None:
+        # Owned by another worker: only the shared record is available here
+        record = session_state.get(session_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return {"session_id": session_id, "local": False, "state": record}
+    streamer = session_data.assemblyai_streamer
+    return {
+        "session_id": session_id,
+        "local": True,
+        "state": session_state.get(session_id),
+        "chunk_count": session_data.chunk_count,
+        "duration": round(time.time() - session_data.start_time, 2),
+        "recording": session_data.recorder.stats(),
+        "input_format": streamer.input_format if streamer else None,
+        "decoder": streamer.decoder.stats() if streamer and streamer.decoder else None,
+        "pcm_converter": streamer.pcm_converter.stats() if streamer and streamer.pcm_converter else None,
+        "vad": streamer.vad.stats() if streamer and streamer.vad else None,
+        "framing": streamer.aligner.stats() if streamer and streamer.aligner else None,
+        "stt_sender": streamer.sender.stats() if streamer and streamer.sender else None,
+        "stt_events": streamer.events.stats() if streamer and streamer.events else None,
+        "turn_to_llm_ms": latency_summary(streamer.turn_to_llm_ms) if streamer else None,
+        "speculation": streamer.prefetcher.stats() if streamer and streamer.prefetcher else None,
+        "outbound": session_data.outbound.stats() if session_data.outbound else None,
+        "instrumentation": session_data.instrumentation.stats() if session_data.instrumentation else None,
+        "audio_mode": streamer.audio_mode if streamer else None,
+        "audio_frames_out": streamer.audio_sequence if streamer else 0,
+        "audio_bytes_out": streamer.audio_bytes_out if streamer else 0,
+        "barge_in": {
+            "count": streamer.barge_in_count,
+            "cancel": latency_summary(streamer.barge_in_ms)
+        } if streamer else None
+    }
+
+@app.get("/ws/sessions/{session_id}/captures")
+async def streaming_session_captures(session_id: str):
+    """Payloads captured for a session (requires DEBUG_CAPTURE > 0)"""
+    session_data = streaming_sessions.get(session_id)
+    if session_data is None or session_data.instrumentation is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {
+        "session_id": session_id,
+        "captures": session_data.instrumentation.captures()
+    }
+
 # Keep uploads dir available for streaming saves
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -708,9 +1227,12 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # 🔹 Day 9: Full Non-Streaming Pipeline (with fallback)
 # ============================================================
 @app.post("/llm/query")
-async def llm_query(file: UploadFile = File(...), voice: str = Form("default")):
+async def llm_query(file: UploadFile = File(...), voice: str = Form("default"), stream: bool = Form(False)):
     """
     Full pipeline: audio -> transcription -> LLM -> Murf TTS -> audio response
+
+    With ``stream=true`` the reply is streamed: audio for each sentence is sent
+    as soon as it is synthesized instead of after the whole reply.
     """
     if not GEMINI_API_KEY or not MURF_API_KEY or not ASSEMBLYAI_API_KEY:
         # Directly return fallback audio when missing keys
@@ -719,20 +1241,28 @@ async def llm_query(file: UploadFile = File(...), voice: str = Form("default")):
 
     try:
         audio_bytes = await file.read()
-        transcript = transcriber.transcribe(audio_bytes)
-        user_text = transcript.text
+        user_text = await transcribe_bytes(audio_bytes, api_key=ASSEMBLYAI_API_KEY)
         if not user_text.strip():
             raise HTTPException(status_code=400, detail="No speech detected in audio")
 
+        if stream:
+            return StreamingResponse(
+                stream_spoken_reply(
+                    [{"role": "user", "content": user_text}],
+                    resolve_voice_id(voice),
+                    MURF_API_KEY,
+                    gemini_api_key=GEMINI_API_KEY,
+                ),
+                media_type="audio/mpeg",
+            )
+
         # Gemini call
         gemini_url = "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent"
         headers = {"Content-Type": "application/json"}
         params = {"key": GEMINI_API_KEY}
         payload = {"contents": [{"parts": [{"text": user_text}]}]}
 
-        gemini_response = requests.post(gemini_url, headers=headers, params=params, json=payload, timeout=60)
-        gemini_response.raise_for_status()
-        data = gemini_response.json()
+        data = await http_client.post_json(gemini_url, headers=headers, params=params, json=payload, timeout=60)
 
         if "candidates" not in data or not data["candidates"]:
             raise RuntimeError("No response from Gemini API")
@@ -741,40 +1271,11 @@ async def llm_query(file: UploadFile = File(...), voice: str = Form("default")):
         if len(llm_text) > 3000:
             llm_text = llm_text[:3000]
 
-        # Murf TTS
-        voice_map = {
-            "default": "en-US-natalie",
-            "narrator": "en-US-terrell",
-            "support": "en-US-miles",
-            "sergeant": "en-US-ken",
-            "game": "en-US-paul"
-        }
-        voice_id = voice_map.get(voice.lower(), "en-US-natalie")
-
-        murf_headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "api-key": MURF_API_KEY or ""
-        }
-        murf_payload = {"text": llm_text, "voice_id": voice_id, "format": "mp3"}
-
-        murf_response = requests.post(
-            "https://api.murf.ai/v1/speech/generate",
-            headers=murf_headers,
-            json=murf_payload,
-            timeout=60,
-        )
-        murf_response.raise_for_status()
-        murf_data = murf_response.json()
-
-        audio_url = murf_data.get("audioFile")
-        if not audio_url:
-            raise RuntimeError("Murf API did not return audioFile")
-
-        audio_file = requests.get(audio_url, timeout=60)
-        audio_file.raise_for_status()
+        # Murf TTS (served from the TTS cache when this reply was synthesized before)
+        voice_id = resolve_voice_id(voice)
+        audio_content = await synthesize_speech_bytes(llm_text, voice_id, api_key=MURF_API_KEY)
 
-        return StreamingResponse(BytesIO(audio_file.content), media_type="audio/mpeg")
+        return StreamingResponse(BytesIO(audio_content), media_type="audio/mpeg")
 
     except Exception:
         audio_bytes = get_fallback_audio_bytes()
@@ -785,44 +1286,40 @@ async def llm_query(file: UploadFile = File(...), voice: str = Form("default")):
 # ============================================================
 # File storage for chat history
 CHAT_HISTORY_FILE = "chat_history.json"
-chat_history_store = {}
 
-def load_chat_history():
-    """Load chat history from JSON file"""
-    try:
-        if os.path.exists(CHAT_HISTORY_FILE):
-            with open(CHAT_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"✅ Loaded chat history: {len(data)} sessions")
-                return data
-        else:
-            print("📝 No existing chat history file found, starting fresh")
-            return {}
-    except Exception as e:
-        print(f"⚠️ Error loading chat history: {e}")
-        return {}
+# Load existing chat history on startup (append-only log + snapshot by default)
+history_store = create_history_store(CHAT_HISTORY_FILE)
+history_store.load()
 
-def save_chat_history():
-    """Save chat history to JSON file"""
-    try:
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(chat_history_store, f, indent=2, ensure_ascii=False)
-        print(f"💾 Saved chat history: {len(chat_history_store)} sessions")
-    except Exception as e:
-        print(f"❌ Error saving chat history: {e}")
+# Gemini client for the non-streaming chat pipeline
+chat_llm = GeminiService(api_key=GEMINI_API_KEY)
+
+# Page size bounds for the paginated history/session endpoints
+MAX_PAGE_SIZE = 500
 
-# Load existing chat history on startup
-chat_history_store = load_chat_history()
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Requested page size within 1..MAX_PAGE_SIZE (default DEFAULT_PAGE_SIZE)"""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
 
 @app.post("/agent/chat/{session_id}")
-async def chat_with_history(session_id: str, file: UploadFile = File(...), voice: str = Form("default")):
+async def chat_with_history(
+    session_id: str,
+    file: UploadFile = File(...),
+    voice: str = Form("default"),
+    stream: bool = Form(False)
+):
+    """
+    Chat pipeline with persistent history
+
+    With ``stream=true`` the reply audio is streamed sentence by sentence and
+    the assistant message is stored once the reply has been generated.
+    """
     # If any critical key is missing, return fallback immediately
     if not ASSEMBLYAI_API_KEY or not GEMINI_API_KEY or not MURF_API_KEY:
         # Append fallback assistant message to history for transparency
-        if session_id not in chat_history_store:
-            chat_history_store[session_id] = []
-        chat_history_store[session_id].append({"role": "assistant", "content": FALLBACK_MESSAGE})
-        save_chat_history()
+        history_store.append_message(session_id, "assistant", FALLBACK_MESSAGE)
         audio_bytes = get_fallback_audio_bytes()
         return StreamingResponse(BytesIO(audio_bytes), media_type="audio/mpeg")
 
@@ -832,53 +1329,42 @@ async def chat_with_history(session_id: str, file: UploadFile = File(...), voice
 
         # Transcribe using AssemblyAI
         try:
-            transcript = transcriber.transcribe(audio_bytes)
-            user_text = transcript.text
+            user_text = await transcribe_bytes(audio_bytes, api_key=ASSEMBLYAI_API_KEY)
         except Exception:
             # Transcription failed → fallback
-            if session_id not in chat_history_store:
-                chat_history_store[session_id] = []
-            chat_history_store[session_id].append({"role": "assistant", "content": FALLBACK_MESSAGE})
-            save_chat_history()
+            history_store.append_message(session_id, "assistant", FALLBACK_MESSAGE)
             fb = get_fallback_audio_bytes()
             return StreamingResponse(BytesIO(fb), media_type="audio/mpeg")
 
         if not user_text or not user_text.strip():
             raise HTTPException(status_code=400, detail="No speech detected in audio")
 
-        # Get or create history
-        if session_id not in chat_history_store:
-            chat_history_store[session_id] = []
-        history = chat_history_store[session_id]
-
         # Append user message
-        history.append({"role": "user", "content": user_text})
-        save_chat_history()
-
-        # Prepare Gemini request with full history
-        gemini_history = []
-        for msg in history:
-            role = "user" if msg["role"] == "user" else "model"
-            gemini_history.append({"role": role, "parts": [{"text": msg["content"]}]})
-
-        gemini_payload = {"contents": gemini_history}
-        gemini_url = "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent"
-        headers = {"Content-Type": "application/json"}
-        params = {"key": GEMINI_API_KEY}
+        history_store.append_message(session_id, "user", user_text)
+        history = history_store.get_messages(session_id)
+        # Recent turns within the token budget, older ones as a rolling summary
+        messages = context_window.build(session_id, history)
+
+        if stream:
+            def store_reply(reply: Optional[str]):
+                history_store.append_message(session_id, "assistant", reply or FALLBACK_MESSAGE)
+
+            return StreamingResponse(
+                stream_spoken_reply(
+                    messages,
+                    resolve_voice_id(voice),
+                    MURF_API_KEY,
+                    gemini_api_key=GEMINI_API_KEY,
+                    on_complete=store_reply,
+                ),
+                media_type="audio/mpeg",
+            )
 
         try:
-            gemini_response = requests.post(
-                gemini_url, headers=headers, params=params, json=gemini_payload, timeout=60
-            )
-            gemini_response.raise_for_status()
-            data = gemini_response.json()
-            if "candidates" not in data or not data["candidates"]:
-                raise RuntimeError("No response from Gemini API")
-            llm_text = data["candidates"][0]["content"]["parts"][0]["text"]
+            llm_text = await chat_llm.generate_response(messages)
         except Exception:
             # LLM failure → fallback
-            history.append({"role": "assistant", "content": FALLBACK_MESSAGE})
-            save_chat_history()
+            history_store.append_message(session_id, "assistant", FALLBACK_MESSAGE)
             fb = get_fallback_audio_bytes()
             return StreamingResponse(BytesIO(fb), media_type="audio/mpeg")
 
@@ -886,41 +1372,14 @@ async def chat_with_history(session_id: str, file: UploadFile = File(...), voice
             llm_text = llm_text[:3000]
 
         # Append assistant reply
-        history.append({"role": "assistant", "content": llm_text})
-        save_chat_history()
-
-        # Murf TTS
-        voice_map = {
-            "default": "en-US-natalie",
-            "narrator": "en-US-terrell",
-            "support": "en-US-miles",
-            "sergeant": "en-US-ken",
-            "game": "en-US-paul"
-        }
-        voice_id = voice_map.get(voice.lower(), "en-US-natalie")
+        history_store.append_message(session_id, "assistant", llm_text)
 
-        murf_headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "api-key": MURF_API_KEY or ""
-        }
-        murf_payload = {"text": llm_text, "voice_id": voice_id, "format": "mp3"}
+        # Murf TTS (served from the TTS cache when this reply was synthesized before)
+        voice_id = resolve_voice_id(voice)
 
         try:
-            murf_response = requests.post(
-                "https://api.murf.ai/v1/speech/generate",
-                headers=murf_headers,
-                json=murf_payload,
-                timeout=60,
-            )
-            murf_response.raise_for_status()
-            murf_data = murf_response.json()
-            audio_url = murf_data.get("audioFile")
-            if not audio_url:
-                raise RuntimeError("Murf API did not return audioFile")
-            audio_file = requests.get(audio_url, timeout=60)
-            audio_file.raise_for_status()
-            return StreamingResponse(BytesIO(audio_file.content), media_type="audio/mpeg")
+            audio_content = await synthesize_speech_bytes(llm_text, voice_id, api_key=MURF_API_KEY)
+            return StreamingResponse(BytesIO(audio_content), media_type="audio/mpeg")
         except Exception:
             fb = get_fallback_audio_bytes()
             return StreamingResponse(BytesIO(fb), media_type="audio/mpeg")
@@ -932,23 +1391,40 @@ async def chat_with_history(session_id: str, file: UploadFile = File(...), voice
         return StreamingResponse(BytesIO(fb), media_type="audio/mpeg")
 
 @app.get("/agent/chat/{session_id}/history")
-async def get_chat_history(session_id: str):
-    """Get chat history for a session (for debugging)"""
-    if session_id not in chat_history_store:
+async def get_chat_history(session_id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Get chat history for a session (for debugging)
+
+    Without ``limit`` the full history is returned; with it, one page
+    (oldest first) plus ``next_cursor`` to pass back for the next page.
+    """
+    if not history_store.has_session(session_id):
         return {"messages": [], "session_id": session_id}
     
+    if limit is None and cursor is None:
+        messages = history_store.get_messages(session_id)
+        return {
+            "messages": [message.to_dict() for message in messages],
+            "session_id": session_id,
+            "message_count": len(messages)
+        }
+    
+    try:
+        messages, next_cursor = history_store.get_messages_page(session_id, cursor, clamp_page_size(limit))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     return {
-        "messages": chat_history_store[session_id],
+        "messages": messages,
         "session_id": session_id,
-        "message_count": len(chat_history_store[session_id])
+        "message_count": len(messages),
+        "next_cursor": next_cursor
     }
 
 @app.delete("/agent/chat/{session_id}")
 async def delete_chat_session(session_id: str):
     """Delete a specific chat session"""
-    if session_id in chat_history_store:
-        del chat_history_store[session_id]
-        save_chat_history()
+    context_window.forget(session_id)
+    if history_store.delete_session(session_id):
         return {"message": f"Session {session_id} deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -956,23 +1432,23 @@ async def delete_chat_session(session_id: str):
 @app.delete("/agent/chat/all")
 async def delete_all_chat_sessions():
     """Delete all chat sessions"""
-    session_count = len(chat_history_store)
-    chat_history_store.clear()
-    save_chat_history()
+    session_count = history_store.clear()
+    context_window.clear()
     return {"message": f"All {session_count} sessions deleted successfully"}
 
 @app.get("/agent/chat/sessions/list")
-async def list_all_sessions():
-    """List all active chat sessions"""
-    sessions = []
-    for session_id, messages in chat_history_store.items():
-        sessions.append({
-            "session_id": session_id,
-            "message_count": len(messages),
-            "last_message": messages[-1]["content"][:100] + "..." if messages else "No messages",
-            "created": "N/A"
-        })
-    return {"sessions": sessions, "total_sessions": len(sessions)}
+async def list_all_sessions(cursor: Optional[str] = None, limit: Optional[int] = None):
+    """List chat sessions, one page at a time (``next_cursor`` fetches the next page)"""
+    try:
+        page, next_cursor = history_store.list_sessions_page(cursor, clamp_page_size(limit))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    sessions = [{"created": "N/A", **session} for session in page]
+    return {
+        "sessions": sessions,
+        "total_sessions": history_store.session_count(),
+        "next_cursor": next_cursor
+    }
 
 @app.get("/agent/chat/test")
 async def test_chat_endpoint():
@@ -981,7 +1457,9 @@ async def test_chat_endpoint():
         "status": "working",
         "message": "Chat history endpoint is functional",
         "chat_history_file": CHAT_HISTORY_FILE,
-        "sessions_count": len(chat_history_store),
+        "sessions_count": history_store.session_count(),
+        "history_backend": history_store.backend_name,
+        "context_window": context_window.stats(),
         "api_keys": {
             "gemini": bool(GEMINI_API_KEY),
             "murf": bool(MURF_API_KEY),
@@ -995,8 +1473,10 @@ async def test_chat_endpoint():
 async def shutdown_event():
     """Save chat history when server shuts down"""
     print("🔄 Server shutting down, saving chat history...")
-    save_chat_history()
+    history_store.close()
+    session_state.close()
     print("✅ Chat history saved successfully")
+    await close_http_client()
 
 # WebSocket endpoint for audio streaming
 @app.websocket("/ws/audio")
@@ -1042,6 +1522,13 @@ async def generate_speech(tts_request: dict):
 @app.on_event("startup")
 async def startup_event():
     global stream_manager
+    # Records left behind by a worker that died without closing its sessions
+    try:
+        pruned = session_state.prune(SESSION_STATE_TTL)
+        if pruned:
+            logger.info(f"🧹 Pruned {pruned} stale session record(s)")
+    except Exception as e:
+        logger.error(f"❌ Error pruning session state: {e}")
     try:
         if MURF_API_KEY:
             stream_manager = MurfStreamingService(api_key=MURF_API_KEY)